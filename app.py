@@ -7,14 +7,23 @@ import streamlit as st
 import json
 import os
 import hashlib
-import math
+import html
 import re
+import time
+import zlib
+from collections import Counter
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
-from openai import OpenAI
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from pathlib import Path
 import tempfile
-import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # ============================================================================
 # CONSTANTS
@@ -29,8 +38,27 @@ TENSES = ["Past", "Present"]
 LANES = ["Narration", "Dialogue", "Interiority", "Action"]
 VOICES = ["None", "Voice A", "Voice B"]
 
+# Option positions for selectbox defaults; unknown saved values fall back to the first option
+_STYLE_INDEX = {name: i for i, name in enumerate(STYLES)}
+_GENRE_INDEX = {name: i for i, name in enumerate(GENRES)}
+_POV_INDEX = {name: i for i, name in enumerate(POVS)}
+_TENSE_INDEX = {name: i for i, name in enumerate(TENSES)}
+
 AUTOSAVE_PATH = "autosave/olivetti_state.json"
+VECTORS_PATH = "autosave/olivetti_vectors.npz"
+SIDECAR_TEXTS_SUFFIX = "#texts"  # sidecar entry holding the digest of a bank's texts
+SIDECAR_DIGEST_KEY = "#vectors_digest"  # sidecar entry identifying the whole sidecar
 BACKUP_COUNT = 3
+BACKUP_INTERVAL = 30  # seconds between backup rotations
+
+# Session completion cache
+LLM_CACHE_SIZE = 64
+LLM_CACHE_THRESHOLD = 0.92
+LLM_CACHE_MAX_SEMANTIC_TEMPERATURE = 0.6
+BATCH_MAX_WORKERS = 4  # concurrent API requests per batch
+OPENAI_KEEPALIVE_CONNECTIONS = 16
+OPENAI_KEEPALIVE_EXPIRY = 300  # seconds an idle connection stays pooled
+OPENAI_WARMUP_URL = "https://api.openai.com/v1/models"
 
 # Color palette
 CREAM = "#F5F5DC"
@@ -41,42 +69,70 @@ CHARCOAL = "#36454F"
 # VECTOR STORAGE - Hash-based implementation (no external APIs)
 # ============================================================================
 
-def text_to_hash_vector(text: str, dimensions: int = 512) -> List[float]:
+_TOKEN_RE = re.compile(r'\b\w+\b')
+
+
+def text_to_hash_vector(text: str, dimensions: int = 512) -> np.ndarray:
     """
-    Convert text to bag-of-words hash vector using MD5 hashing.
+    Convert text to bag-of-words hash vector using CRC32 hashing.
     
     Args:
         text: Input text to vectorize
         dimensions: Vector dimensionality (default 512)
     
     Returns:
-        Sparse vector representation
+        L2-normalized float32 vector
     """
-    # Tokenize text
-    words = re.findall(r'\b\w+\b', text.lower())
+    # Tokenize and count in C, so repeated words are hashed only once
+    word_counts = Counter(_TOKEN_RE.findall(text.lower()))
+    
+    # Hash each distinct word; CRC32 is stable across processes and far cheaper
+    # than a cryptographic digest for bucket indexing
+    hashes = np.fromiter(
+        (zlib.crc32(word.encode()) for word in word_counts),
+        dtype=np.uint32,
+        count=len(word_counts)
+    )
+    counts = np.fromiter(word_counts.values(), dtype=np.float64, count=len(word_counts))
     
-    # Create sparse vector
-    vector = [0.0] * dimensions
+    # Reduce to bucket indices in one vectorized step (a mask for power-of-two sizes)
+    if dimensions & (dimensions - 1) == 0:
+        indices = hashes & np.uint32(dimensions - 1)
+    else:
+        indices = hashes % np.uint32(dimensions)
     
-    # Hash each word and accumulate into vector
-    for word in words:
-        word_hash = hashlib.md5(word.encode()).hexdigest()
-        # Use first few hex digits to determine index
-        index = int(word_hash[:8], 16) % dimensions
-        vector[index] += 1.0
+    # Accumulate bucket counts in a single C loop
+    vector = np.bincount(indices, weights=counts, minlength=dimensions).astype(np.float32)
     
     # Normalize vector
-    magnitude = math.sqrt(sum(x * x for x in vector))
+    magnitude = np.sqrt(vector @ vector)
     if magnitude > 0:
-        vector = [x / magnitude for x in vector]
+        vector /= magnitude
+    
+    return vector
+
+
+@st.cache_resource(max_entries=512, show_spinner=False)
+def _cached_hash_vector(text: str, dimensions: int = 512) -> np.ndarray:
+    """
+    Memoized text_to_hash_vector for repeated query text.
     
+    The same draft tail is vectorized by several retrieval paths and again on
+    repeated actions. The cached array is shared between callers, so it is
+    marked read-only.
+    """
+    vector = text_to_hash_vector(text, dimensions)
+    vector.setflags(write=False)
     return vector
 
 
-def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
+def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
     """
     Compute cosine similarity between two vectors.
     
+    Both vectors are expected to be L2-normalized (as produced by
+    text_to_hash_vector), so the dot product is the cosine.
+    
     Args:
         vec1: First vector
         vec2: Second vector
@@ -84,46 +140,180 @@ def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
     Returns:
         Similarity score between 0 and 1
     """
-    if len(vec1) != len(vec2):
-        return 0.0
+    return float(np.clip(np.vdot(vec1, vec2), 0.0, 1.0))
+
+
+class SampleBank:
+    """
+    Struct-of-arrays store for training samples.
+    
+    Sample vectors live in one contiguous (N, dimensions) float32 matrix with
+    a parallel list of sample texts, so retrieval is a single streaming
+    matrix-vector product instead of a walk over per-sample lists.
     
-    dot_product = sum(a * b for a, b in zip(vec1, vec2))
-    return max(0.0, min(1.0, dot_product))
+    Rows are kept in a preallocated buffer that grows geometrically, so adding
+    a sample writes one row instead of reallocating the whole matrix.
+    """
+    
+    MIN_CAPACITY = 16
+    
+    def __init__(self, texts: Optional[List[str]] = None, matrix: Optional[np.ndarray] = None,
+                 dimensions: int = 512):
+        """
+        Args:
+            texts: Sample texts
+            matrix: Precomputed vectors for texts (recomputed if missing or stale)
+            dimensions: Vector dimensionality (default 512)
+        """
+        self.dimensions = dimensions
+        self.texts: List[str] = list(texts or [])
+        
+        if matrix is None or matrix.shape != (len(self.texts), dimensions):
+            matrix = np.empty((len(self.texts), dimensions), dtype=np.float32)
+            for i, text in enumerate(self.texts):
+                matrix[i] = text_to_hash_vector(text, dimensions)
+        
+        self._rows = np.ascontiguousarray(matrix, dtype=np.float32)
+        self._size = len(self.texts)
+    
+    @property
+    def matrix(self) -> np.ndarray:
+        """(N, dimensions) view of the stored sample vectors, oldest first."""
+        return self._rows[:self._size]
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def add(self, text: str, limit: Optional[int] = None):
+        """
+        Add a sample, keeping only the newest `limit` samples if given.
+        
+        Args:
+            text: Sample text
+            limit: Maximum number of samples to retain
+        """
+        vector = text_to_hash_vector(text, self.dimensions)
+        
+        # At the limit, drop the oldest rows by shifting within the buffer
+        if limit is not None and self._size >= limit:
+            drop = self._size - limit + 1
+            self._rows[:self._size - drop] = self._rows[drop:self._size]
+            del self.texts[:drop]
+            self._size -= drop
+        
+        if self._size == len(self._rows):
+            capacity = max(self.MIN_CAPACITY, 2 * self._size)
+            if limit is not None:
+                capacity = min(capacity, limit)
+            rows = np.empty((capacity, self.dimensions), dtype=np.float32)
+            rows[:self._size] = self._rows[:self._size]
+            self._rows = rows
+        
+        self._rows[self._size] = vector
+        self.texts.append(text)
+        self._size += 1
+
+
+def lane_bank(banks: Dict[str, SampleBank], lane: str) -> SampleBank:
+    """Sample bank for a lane, created the first time a sample is added to it."""
+    bank = banks.get(lane)
+    if bank is None:
+        bank = banks[lane] = SampleBank()
+    return bank
 
 
-def retrieve_similar_samples(query_text: str, sample_bank: List[Dict], top_k: int = 3) -> List[Dict]:
+def _top_texts(sample_bank: SampleBank, similarities: np.ndarray, top_k: int) -> List[str]:
+    """Texts of the top_k highest-scoring samples, best first."""
+    # Partial selection of the top_k, then order just those
+    k = min(top_k, len(sample_bank))
+    top_idx = np.argpartition(-similarities, k - 1)[:k]
+    top_idx = top_idx[np.argsort(-similarities[top_idx], kind='stable')]
+    return [sample_bank.texts[i] for i in top_idx]
+
+
+def retrieve_similar_samples(query_text: str, sample_bank: SampleBank, top_k: int = 3) -> List[str]:
     """
     Find most similar samples using cosine similarity.
     
     Args:
         query_text: Query text to match
-        sample_bank: List of samples with 'text' and 'vector' keys
+        sample_bank: Bank of samples to search
         top_k: Number of top samples to return
     
     Returns:
-        List of most similar samples
+        Texts of the most similar samples, best first
+    """
+    return retrieve_from_banks(query_text, [sample_bank], top_k)[0]
+
+
+def retrieve_from_banks(query_text: str, sample_banks: List[SampleBank], top_k: int = 3) -> List[List[str]]:
     """
-    if not sample_bank:
-        return []
+    Find the most similar samples in each of several banks for one query.
     
-    query_vector = text_to_hash_vector(query_text)
+    The query is vectorized once and shared by every bank.
     
-    # Compute similarities
-    similarities = []
-    for sample in sample_bank:
-        if 'vector' in sample:
-            sim = cosine_similarity(query_vector, sample['vector'])
-            similarities.append((sim, sample))
+    Args:
+        query_text: Query text to match
+        sample_banks: Banks of samples to search
+        top_k: Number of top samples to return per bank
     
-    # Sort by similarity and return top_k
-    similarities.sort(reverse=True, key=lambda x: x[0])
-    return [sample for _, sample in similarities[:top_k]]
+    Returns:
+        Texts of the most similar samples for each bank, best first
+    """
+    results: List[List[str]] = [[] for _ in sample_banks]
+    active = [i for i, bank in enumerate(sample_banks) if len(bank)]
+    if not active or top_k <= 0:
+        return results
+    
+    dimensions = sample_banks[active[0]].dimensions
+    query_vector = _cached_hash_vector(query_text, dimensions)
+    
+    # Score every sample of every bank with one matrix-vector product each
+    for i in active:
+        bank = sample_banks[i]
+        results[i] = _top_texts(bank, bank.matrix @ query_vector, top_k)
+    
+    return results
 
 
 # ============================================================================
 # LANE DETECTION
 # ============================================================================
 
+INTERIORITY_MARKERS = [
+    'thought', 'wondered', 'realized', 'felt', 'knew', 'remembered',
+    'understood', 'believed', 'hoped', 'feared', 'wished',
+    'could see', 'could hear', 'could feel'
+]
+ACTION_MARKERS = [
+    'ran', 'jumped', 'grabbed', 'threw', 'kicked', 'punched', 'struck',
+    'dashed', 'sprinted', 'lunged', 'dove', 'rolled', 'ducked', 'swung',
+    'fired', 'shot', 'slammed', 'crashed', 'leaped'
+]
+SENTENCE_TERMINATORS = ('.', '!', '?')
+QUOTE_CHARS = ('"', '\u201c', '\u201d')
+
+# Both marker sets in one alternation, so a paragraph is scanned once; group 1
+# holds interiority hits, and word boundaries keep 'ran' from matching 'branch'
+_LANE_MARKER_RE = re.compile(
+    r'\b(?:(' + '|'.join(map(re.escape, INTERIORITY_MARKERS)) + r')|'
+    + '|'.join(map(re.escape, ACTION_MARKERS)) + r')\b',
+    re.IGNORECASE
+)
+
+
+def _last_paragraph(text: str) -> str:
+    """Return the final non-blank paragraph, scanning back from the end of the text."""
+    end = len(text)
+    while end > 0:
+        start = text.rfind('\n\n', 0, end)
+        para = text[start + 2 if start >= 0 else 0:end].strip()
+        if para or start < 0:
+            return para
+        end = start
+    return ""
+
+
 def detect_lane(text: str) -> str:
     """
     Detect writing lane from text content.
@@ -134,43 +324,24 @@ def detect_lane(text: str) -> str:
     Returns:
         Lane name: "Dialogue", "Interiority", "Action", or "Narration"
     """
-    if not text:
+    last_para = _last_paragraph(text)
+    if not last_para:
         return "Narration"
     
-    # Get last paragraph
-    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-    if not paragraphs:
-        return "Narration"
+    # Dialogue detection - quoted speech (straight or curly quotes)
+    quote_count = sum(last_para.count(q) for q in QUOTE_CHARS)
+    if quote_count >= 2:
+        return "Dialogue"
     
-    last_para = paragraphs[-1]
+    # One pass: any thought pattern means interiority, else count kinetic verbs
+    action_hits = 0
+    for match in _LANE_MARKER_RE.finditer(last_para):
+        if match.group(1) is not None:
+            return "Interiority"
+        action_hits += 1
     
-    # Dialogue detection - quoted speech
-    if '"' in last_para or '"' in last_para or '"' in last_para:
-        quote_count = last_para.count('"') + last_para.count('"') + last_para.count('"')
-        if quote_count >= 2:
-            return "Dialogue"
-    
-    # Interiority detection - thought patterns
-    interiority_markers = [
-        'thought', 'wondered', 'realized', 'felt', 'knew', 'remembered',
-        'understood', 'believed', 'hoped', 'feared', 'wished',
-        'could see', 'could hear', 'could feel'
-    ]
-    lower_para = last_para.lower()
-    if any(marker in lower_para for marker in interiority_markers):
-        return "Interiority"
-    
-    # Action detection - kinetic verbs
-    action_markers = [
-        'ran', 'jumped', 'grabbed', 'threw', 'kicked', 'punched', 'struck',
-        'dashed', 'sprinted', 'lunged', 'dove', 'rolled', 'ducked', 'swung',
-        'fired', 'shot', 'slammed', 'crashed', 'leaped'
-    ]
-    if any(marker in lower_para for marker in action_markers):
-        # Count action verbs
-        action_count = sum(1 for marker in action_markers if marker in lower_para)
-        if action_count >= 2:
-            return "Action"
+    if action_hits >= 2:
+        return "Action"
     
     # Default to narration
     return "Narration"
@@ -180,49 +351,297 @@ def detect_lane(text: str) -> str:
 # OPENAI INTEGRATION
 # ============================================================================
 
-def call_openai(system_prompt: str, user_prompt: str, temperature: float) -> Optional[str]:
+@st.cache_resource(show_spinner=False)
+def _openai_http_client() -> Any:
+    """Keep-alive connection pool shared by every OpenAI client in the process."""
+    # Imported here so reruns that never call the API skip loading the SDK
+    import httpx
+    return httpx.Client(
+        limits=httpx.Limits(max_keepalive_connections=OPENAI_KEEPALIVE_CONNECTIONS,
+                            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY),
+        timeout=60
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def _openai_client(api_key: str) -> Any:
+    """Shared OpenAI client, so its HTTP connection pool persists across calls."""
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, http_client=_openai_http_client())
+
+
+@st.cache_resource(show_spinner=False)
+def _prewarm_openai() -> None:
+    """
+    Open a pooled connection to the API in the background, once per process.
+    
+    The first action of a session then skips the TCP and TLS handshake.
+    Failures are ignored; the real request will surface any problem.
+    """
+    http_client = _openai_http_client()
+    
+    def warm():
+        try:
+            http_client.head(OPENAI_WARMUP_URL, timeout=10)
+        except Exception:
+            pass
+    
+    threading.Thread(target=warm, name="openai-prewarm", daemon=True).start()
+
+
+def _llm_cache_lookup(cache: Dict, exact_key: bytes, system_digest: bytes, query_vector: np.ndarray,
+                      action: Optional[str], temperature: float) -> Optional[str]:
+    """
+    Find a cached completion for a request.
+    
+    Exact matches always apply. Near-duplicate user prompts are reused only for
+    the same action, system prompt and temperature bucket, and only at low
+    temperature, where varied output is not the point.
+    """
+    if exact_key in cache['keys']:
+        return cache['completions'][cache['keys'].index(exact_key)]
+    
+    if temperature > LLM_CACHE_MAX_SEMANTIC_TEMPERATURE or not cache['keys']:
+        return None
+    
+    similarities = cache['matrix'] @ query_vector
+    wanted = (system_digest, action, round(temperature, 1))
+    for i in np.argsort(-similarities, kind='stable'):
+        if similarities[i] < LLM_CACHE_THRESHOLD:
+            break
+        if cache['meta'][i] == wanted:
+            return cache['completions'][i]
+    return None
+
+
+def _llm_cache_insert(cache: Dict, exact_key: bytes, system_digest: bytes, query_vector: np.ndarray,
+                      action: Optional[str], temperature: float, completion: str):
+    """Add a completion to the cache, evicting the oldest beyond LLM_CACHE_SIZE."""
+    cache['keys'].append(exact_key)
+    cache['meta'].append((system_digest, action, round(temperature, 1)))
+    cache['completions'].append(completion)
+    cache['matrix'] = np.vstack([cache['matrix'], query_vector[np.newaxis, :]])
+    
+    if len(cache['keys']) > LLM_CACHE_SIZE:
+        for field in ('keys', 'meta', 'completions'):
+            del cache[field][0]
+        cache['matrix'] = cache['matrix'][1:]
+
+
+def _llm_cache() -> Dict:
+    """Session completion cache, created on first use."""
+    if '_llm_cache' not in st.session_state:
+        st.session_state['_llm_cache'] = {
+            'keys': [], 'meta': [], 'completions': [],
+            'matrix': np.empty((0, 512), dtype=np.float32)
+        }
+    return st.session_state['_llm_cache']
+
+
+def _llm_cache_keys(system_prompt: str, user_prompt: str, temperature: float) -> Tuple[bytes, bytes, np.ndarray]:
+    """(exact key, system prompt digest, query vector) for a request."""
+    exact_key = hashlib.blake2b(
+        '\0'.join((system_prompt, user_prompt, str(temperature))).encode('utf-8'),
+        digest_size=16
+    ).digest()
+    system_digest = hashlib.blake2b(system_prompt.encode('utf-8'), digest_size=16).digest()
+    return exact_key, system_digest, _cached_hash_vector(user_prompt[-800:])
+
+
+def _complete(client: Any, system_prompt: str, user_prompt: str, temperature: float) -> Optional[str]:
+    """Run one chat completion; raises on API errors."""
+    response = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=temperature,
+        max_tokens=2000,
+        timeout=60
+    )
+    return response.choices[0].message.content
+
+
+def _stream_completion(client: Any, system_prompt: str, user_prompt: str, temperature: float) -> Iterator[str]:
+    """Run one chat completion, yielding text deltas as they arrive; raises on API errors."""
+    stream = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        temperature=temperature,
+        max_tokens=2000,
+        timeout=60,
+        stream=True
+    )
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def call_openai_stream(system_prompt: str, user_prompt: str, temperature: float,
+                       action: Optional[str] = None) -> Iterator[str]:
+    """
+    Stream an OpenAI completion so it can be shown while it is generated.
+    
+    A cached completion is yielded whole, and only complete responses are
+    cached. API errors are raised so callers can discard a partial result.
+    
+    Args:
+        system_prompt: System instruction
+        user_prompt: User message
+        temperature: Temperature setting (0.0-1.0)
+        action: Action the request was built for, used to scope cache reuse
+    
+    Yields:
+        Chunks of generated text
+    """
+    if 'OPENAI_API_KEY' not in st.secrets:
+        st.error("OpenAI API key not found. Please add it to .streamlit/secrets.toml")
+        return
+    
+    cache = _llm_cache()
+    keys = _llm_cache_keys(system_prompt, user_prompt, temperature)
+    cached = _llm_cache_lookup(cache, *keys, action, temperature)
+    if cached is not None:
+        yield cached
+        return
+    
+    client = _openai_client(st.secrets['OPENAI_API_KEY'])
+    parts = []
+    for piece in _stream_completion(client, system_prompt, user_prompt, temperature):
+        parts.append(piece)
+        yield piece
+    
+    completion = ''.join(parts)
+    if completion:
+        _llm_cache_insert(cache, *keys, action, temperature, completion)
+
+
+def call_openai(system_prompt: str, user_prompt: str, temperature: float,
+                action: Optional[str] = None) -> Optional[str]:
     """
     Make OpenAI API call with proper error handling.
     
+    Completions are cached per session; see _llm_cache_lookup for reuse rules.
+    
     Args:
         system_prompt: System instruction
         user_prompt: User message
         temperature: Temperature setting (0.0-1.0)
+        action: Action the request was built for, used to scope cache reuse
     
     Returns:
         Generated text or None on error
     """
+    return call_openai_batch([(system_prompt, user_prompt, temperature, action)])[0]
+
+
+def call_openai_batch(requests: List[Tuple[str, str, float, Optional[str]]]) -> List[Optional[str]]:
+    """
+    Make several OpenAI API calls concurrently.
+    
+    Cache hits are answered immediately; the remaining requests run in a small
+    thread pool so their network latency overlaps instead of adding up.
+    
+    Args:
+        requests: (system_prompt, user_prompt, temperature, action) tuples
+    
+    Returns:
+        Generated text (or None on error) for each request, in order
+    """
+    results: List[Optional[str]] = [None] * len(requests)
     try:
         # Get API key from secrets
         if 'OPENAI_API_KEY' not in st.secrets:
             st.error("OpenAI API key not found. Please add it to .streamlit/secrets.toml")
-            return None
+            return results
+        
+        cache = _llm_cache()
+        pending = []
+        for i, (system_prompt, user_prompt, temperature, action) in enumerate(requests):
+            keys = _llm_cache_keys(system_prompt, user_prompt, temperature)
+            results[i] = _llm_cache_lookup(cache, *keys, action, temperature)
+            if results[i] is None:
+                pending.append((i, keys))
+        
+        if not pending:
+            return results
         
-        client = OpenAI(api_key=st.secrets['OPENAI_API_KEY'])
+        client = _openai_client(st.secrets['OPENAI_API_KEY'])
         
-        # Make API call
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=temperature,
-            max_tokens=2000,
-            timeout=60
-        )
+        # Worker threads only talk to the API; Streamlit calls stay on this thread
+        with ThreadPoolExecutor(max_workers=min(len(pending), BATCH_MAX_WORKERS)) as pool:
+            futures = {
+                i: pool.submit(_complete, client, *requests[i][:3])
+                for i, _ in pending
+            }
+        
+        for i, keys in pending:
+            try:
+                result = futures[i].result()
+            except Exception as e:
+                st.error(f"OpenAI API error: {str(e)}")
+                continue
+            
+            results[i] = result
+            if result:
+                _, _, temperature, action = requests[i]
+                _llm_cache_insert(cache, *keys, action, temperature, result)
         
-        return response.choices[0].message.content
+        return results
         
     except Exception as e:
         st.error(f"OpenAI API error: {str(e)}")
-        return None
+        return results
 
 
 # ============================================================================
 # UNIFIED AI BRIEF SYSTEM
 # ============================================================================
 
+_GENRE_DIRECTIVES = {
+    'Thriller': "Maintain tension and pacing. Build suspense. Keep readers on edge. (Intensity: {intensity:.1f})",
+    'Noir': "Use dark, cynical tone. Emphasize moral ambiguity. Employ atmospheric description. (Intensity: {intensity:.1f})",
+    'Horror': "Create dread and unease. Use visceral imagery. Build atmospheric terror. (Intensity: {intensity:.1f})",
+    'Romance': "Emphasize emotional connection. Build romantic tension. Focus on character feelings. (Intensity: {intensity:.1f})",
+    'Fantasy': "Rich world-building. Vivid magical elements. Maintain internal consistency. (Intensity: {intensity:.1f})",
+    'Sci-Fi': "Technical plausibility. Explore implications. Balance explanation with story. (Intensity: {intensity:.1f})",
+    'Historical': "Period-appropriate language. Historical accuracy. Immersive setting details. (Intensity: {intensity:.1f})",
+    'Contemporary': "Modern voice. Current references. Authentic contemporary feel. (Intensity: {intensity:.1f})"
+}
+
+_STYLE_DIRECTIVES = {
+    'Narrative': "Clear storytelling. Forward momentum. Balanced pacing. (Intensity: {intensity:.1f})",
+    'Descriptive': "Rich sensory detail. Vivid imagery. Immersive atmosphere. (Intensity: {intensity:.1f})",
+    'Emotional': "Deep feeling. Emotional resonance. Character interiority. (Intensity: {intensity:.1f})",
+    'Lyrical': "Poetic language. Rhythmic prose. Beautiful phrasing. (Intensity: {intensity:.1f})",
+    'Sparse': "Economy of language. Minimal description. Direct prose. (Intensity: {intensity:.1f})",
+    'Ornate': "Elaborate language. Complex sentences. Rich vocabulary. (Intensity: {intensity:.1f})"
+}
+
+_LANE_CONTEXT = {
+    'Narration': "Continue the narrative flow naturally.",
+    'Dialogue': "Write authentic dialogue with natural speech patterns.",
+    'Interiority': "Explore character thoughts and emotions deeply.",
+    'Action': "Write kinetic, physical action with clear movement."
+}
+
+# Action -> (prompt template, length of draft tail to include)
+_ACTION_PROMPTS = {
+    'Write': ("Continue this draft with 1-3 new paragraphs:\n\n{text}", 1000),
+    'Expand': ("Add depth and detail to this text without changing its meaning:\n\n{text}", 500),
+    'Describe': ("Add vivid sensory description while preserving pace:\n\n{text}", 500),
+    'Rewrite': ("Improve the quality while preserving meaning:\n\n{text}", 500),
+    'Rephrase': ("Replace the final sentence with a stronger alternative. Here's the text:\n\n{text}", 500),
+    'Spell/Grammar': ("Fix spelling, grammar, and punctuation errors:\n\n{text}", 500),
+    'Synonym': ("Provide 12 strong synonym alternatives for the last word, grouped by nuance. Text:\n\n{text}", 200),
+    'Sentence': ("Provide 8 rewrites of the final sentence with varied rhythm and diction. Text:\n\n{text}", 200)
+}
+
+
 def build_partner_brief(action: str, lane: str, project: Dict, voice_bible: Dict) -> Tuple[str, str, float]:
     """
     Assemble complete AI brief from all Voice Bible controls.
@@ -248,8 +667,15 @@ def build_partner_brief(action: str, lane: str, project: Dict, voice_bible: Dict
     # Calculate temperature from AI intensity
     temperature = 0.15 + ai_intensity * 0.95
     
+    # Slice the (possibly very long) draft once; every shorter tail is cut
+    # from this 1000-char copy instead of the full draft
+    draft = project.get('draft', '')
+    tail_1000 = draft[-1000:]
+    tail_500 = tail_1000[-500:]
+    
     # Build system prompt
     system_parts = []
+    sample_sources: List[Tuple[str, SampleBank]] = []
     
     # Core identity
     system_parts.append("You are the Olivetti Creative Editing Partner, an expert writing assistant.")
@@ -268,80 +694,50 @@ def build_partner_brief(action: str, lane: str, project: Dict, voice_bible: Dict
         genre = genre_intelligence.get('genre')
         intensity = genre_intelligence.get('intensity', 0.5)
         
-        genre_directives = {
-            'Thriller': f"Maintain tension and pacing. Build suspense. Keep readers on edge. (Intensity: {intensity:.1f})",
-            'Noir': f"Use dark, cynical tone. Emphasize moral ambiguity. Employ atmospheric description. (Intensity: {intensity:.1f})",
-            'Horror': f"Create dread and unease. Use visceral imagery. Build atmospheric terror. (Intensity: {intensity:.1f})",
-            'Romance': f"Emphasize emotional connection. Build romantic tension. Focus on character feelings. (Intensity: {intensity:.1f})",
-            'Fantasy': f"Rich world-building. Vivid magical elements. Maintain internal consistency. (Intensity: {intensity:.1f})",
-            'Sci-Fi': f"Technical plausibility. Explore implications. Balance explanation with story. (Intensity: {intensity:.1f})",
-            'Historical': f"Period-appropriate language. Historical accuracy. Immersive setting details. (Intensity: {intensity:.1f})",
-            'Contemporary': f"Modern voice. Current references. Authentic contemporary feel. (Intensity: {intensity:.1f})"
-        }
-        
-        if genre in genre_directives:
-            system_parts.append(f"\nGENRE: {genre_directives[genre]}")
+        if genre in _GENRE_DIRECTIVES:
+            system_parts.append(f"\nGENRE: {_GENRE_DIRECTIVES[genre].format(intensity=intensity)}")
     
     # Style Engine
     if style_engine.get('enabled') and style_engine.get('style') != 'Neutral':
         style = style_engine.get('style')
         intensity = style_engine.get('intensity', 0.5)
         
-        style_directives = {
-            'Narrative': f"Clear storytelling. Forward momentum. Balanced pacing. (Intensity: {intensity:.1f})",
-            'Descriptive': f"Rich sensory detail. Vivid imagery. Immersive atmosphere. (Intensity: {intensity:.1f})",
-            'Emotional': f"Deep feeling. Emotional resonance. Character interiority. (Intensity: {intensity:.1f})",
-            'Lyrical': f"Poetic language. Rhythmic prose. Beautiful phrasing. (Intensity: {intensity:.1f})",
-            'Sparse': f"Economy of language. Minimal description. Direct prose. (Intensity: {intensity:.1f})",
-            'Ornate': f"Elaborate language. Complex sentences. Rich vocabulary. (Intensity: {intensity:.1f})"
-        }
-        
-        if style in style_directives:
-            system_parts.append(f"\nSTYLE: {style_directives[style]}")
+        if style in _STYLE_DIRECTIVES:
+            system_parts.append(f"\nSTYLE: {_STYLE_DIRECTIVES[style].format(intensity=intensity)}")
         
         # Retrieve style samples for this lane
         style_banks = voice_bible.get('style_banks', {})
-        lane_samples = style_banks.get(lane, [])
+        lane_samples = style_banks.get(lane)
         if lane_samples:
-            current_text = project.get('draft', '')
-            if current_text:
-                similar = retrieve_similar_samples(current_text[-500:], lane_samples, top_k=2)
-                if similar:
-                    system_parts.append("\nSTYLE EXAMPLES:")
-                    for i, sample in enumerate(similar, 1):
-                        system_parts.append(f"{i}. {sample['text'][:200]}")
+            sample_sources.append(("\nSTYLE EXAMPLES:", lane_samples))
     
     # Trained Voice (Voice Vault)
     if trained_voice.get('enabled') and trained_voice.get('voice') != 'None':
         voice_name = trained_voice.get('voice')
         voice_vault = voice_bible.get('voice_vault', {})
-        voice_samples = voice_vault.get(voice_name, {}).get(lane, [])
-        
+        voice_samples = voice_vault.get(voice_name, {}).get(lane)
         if voice_samples:
-            current_text = project.get('draft', '')
-            if current_text:
-                similar = retrieve_similar_samples(current_text[-500:], voice_samples, top_k=2)
-                if similar:
-                    system_parts.append(f"\nVOICE SAMPLES ({voice_name}):")
-                    for i, sample in enumerate(similar, 1):
-                        system_parts.append(f"{i}. {sample['text'][:200]}")
+            sample_sources.append((f"\nVOICE SAMPLES ({voice_name}):", voice_samples))
+    
+    # Style and voice samples share one query vectorization
+    if sample_sources and tail_500:
+        headers, banks = zip(*sample_sources)
+        for header, similar in zip(headers, retrieve_from_banks(tail_500, list(banks), top_k=2)):
+            if similar:
+                system_parts.append(header)
+                for i, sample in enumerate(similar, 1):
+                    system_parts.append(f"{i}. {sample[:200]}")
     
     # Match My Style (one-shot)
     if match_my_style and match_my_style.strip():
         system_parts.append(f"\nMATCH THIS STYLE:\n{match_my_style[:300]}")
     
     # Lane context
-    lane_context = {
-        'Narration': "Continue the narrative flow naturally.",
-        'Dialogue': "Write authentic dialogue with natural speech patterns.",
-        'Interiority': "Explore character thoughts and emotions deeply.",
-        'Action': "Write kinetic, physical action with clear movement."
-    }
-    system_parts.append(f"\nCONTEXT: {lane_context.get(lane, '')}")
+    system_parts.append(f"\nCONTEXT: {_LANE_CONTEXT.get(lane, '')}")
     
     # Story Bible context
     story_bible = project.get('story_bible', {})
-    if any(story_bible.get(section) for section in STORY_BIBLE_SECTIONS):
+    if has_story_bible(project):
         system_parts.append("\nSTORY CONTEXT:")
         for section in STORY_BIBLE_SECTIONS:
             content = story_bible.get(section, '').strip()
@@ -351,20 +747,11 @@ def build_partner_brief(action: str, lane: str, project: Dict, voice_bible: Dict
     system_prompt = '\n'.join(system_parts)
     
     # Build user prompt based on action
-    draft = project.get('draft', '')
-    
-    action_prompts = {
-        'Write': f"Continue this draft with 1-3 new paragraphs:\n\n{draft[-1000:]}",
-        'Expand': f"Add depth and detail to this text without changing its meaning:\n\n{draft[-500:]}",
-        'Describe': f"Add vivid sensory description while preserving pace:\n\n{draft[-500:]}",
-        'Rewrite': f"Improve the quality while preserving meaning:\n\n{draft[-500:]}",
-        'Rephrase': f"Replace the final sentence with a stronger alternative. Here's the text:\n\n{draft[-500:]}",
-        'Spell/Grammar': f"Fix spelling, grammar, and punctuation errors:\n\n{draft[-500:]}",
-        'Synonym': f"Provide 12 strong synonym alternatives for the last word, grouped by nuance. Text:\n\n{draft[-200:]}",
-        'Sentence': f"Provide 8 rewrites of the final sentence with varied rhythm and diction. Text:\n\n{draft[-200:]}"
-    }
-    
-    user_prompt = action_prompts.get(action, draft[-1000:])
+    if action in _ACTION_PROMPTS:
+        template, tail_len = _ACTION_PROMPTS[action]
+        user_prompt = template.format(text=tail_1000[-tail_len:])
+    else:
+        user_prompt = tail_1000
     
     return system_prompt, user_prompt, temperature
 
@@ -373,36 +760,184 @@ def build_partner_brief(action: str, lane: str, project: Dict, voice_bible: Dict
 # AUTO-SAVE SYSTEM
 # ============================================================================
 
+def _iter_bank_slots(voice_bible: Dict):
+    """
+    Yield (container, key, sidecar_name) for every sample bank in the Voice Bible.
+    """
+    for lane in list(voice_bible.get('style_banks', {})):
+        yield voice_bible['style_banks'], lane, f"style_banks:{lane}"
+    for voice_name, lanes in voice_bible.get('voice_vault', {}).items():
+        for lane in list(lanes):
+            yield lanes, lane, f"voice_vault:{voice_name}:{lane}"
+
+
+def _texts_digest(texts: List[str]) -> np.ndarray:
+    """Digest of a bank's sample texts, stored beside its sidecar matrix."""
+    digest = hashlib.blake2b(digest_size=16)
+    for text in texts:
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    return np.frombuffer(digest.digest(), dtype=np.uint8)
+
+
+def _pack_banks(state: Dict) -> Tuple[Dict, Dict[str, np.ndarray]]:
+    """
+    Split sample banks out of the state for persistence.
+    
+    Returns:
+        (JSON-serializable state, sidecar arrays: each bank's matrix under its
+        name and the digest of its texts under name + SIDECAR_TEXTS_SUFFIX)
+    """
+    voice_bible = dict(state['voice_bible'])
+    voice_bible['style_banks'] = dict(voice_bible.get('style_banks', {}))
+    voice_bible['voice_vault'] = {
+        name: dict(lanes) for name, lanes in voice_bible.get('voice_vault', {}).items()
+    }
+    
+    matrices = {}
+    for container, key, name in _iter_bank_slots(voice_bible):
+        bank = container[key]
+        if not len(bank):
+            # Empty lanes are recreated on demand, so they aren't persisted
+            del container[key]
+            continue
+        container[key] = [{'text': text} for text in bank.texts]
+        matrices[name] = bank.matrix
+        matrices[name + SIDECAR_TEXTS_SUFFIX] = _texts_digest(bank.texts)
+    
+    return {**state, 'voice_bible': voice_bible}, matrices
+
+
+def _unpack_banks(state: Dict, matrices: Optional[Dict[str, np.ndarray]] = None) -> Dict:
+    """
+    Rebuild SampleBank objects in a loaded state.
+    
+    Vectors come from the sidecar when it was saved for exactly the stored
+    texts, otherwise they are recomputed from the sample text. A sidecar can
+    fall out of step if the JSON write fails or a backup is restored, and a
+    bank at its sample limit keeps the same shape, so the texts' digest is
+    checked rather than just the matrix shape.
+    """
+    matrices = matrices or {}
+    for container, key, name in _iter_bank_slots(state.get('voice_bible', {})):
+        texts = [sample['text'] for sample in container[key]]
+        matrix = matrices.get(name)
+        stored_digest = matrices.get(name + SIDECAR_TEXTS_SUFFIX)
+        if stored_digest is None or not np.array_equal(stored_digest, _texts_digest(texts)):
+            matrix = None
+        container[key] = SampleBank(texts, matrix)
+    return state
+
+
+def _load_sidecar() -> Dict[str, np.ndarray]:
+    """Load sample bank matrices saved alongside the autosave."""
+    try:
+        with np.load(VECTORS_PATH) as sidecar:
+            return {name: sidecar[name] for name in sidecar.files}
+    except (OSError, ValueError):
+        return {}
+
+
+def _sidecar_digest() -> Optional[bytes]:
+    """Vectors digest recorded in the sidecar on disk, or None if there isn't one."""
+    try:
+        with np.load(VECTORS_PATH) as sidecar:
+            return sidecar[SIDECAR_DIGEST_KEY].tobytes()
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _dumps_state(obj: Any) -> bytes:
+    """Serialize state or a project to indented JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, indent=2).encode('utf-8')
+
+
+def _loads_state(data: bytes) -> Any:
+    """Parse JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def mark_state_dirty():
+    """Flag the state as changed so the end-of-run autosave writes it."""
+    st.session_state['_state_dirty'] = True
+
+
+def _update_setting(container: Dict, key: str, value: Any):
+    """Store a widget's value, marking the state dirty only when it changed."""
+    if container.get(key) != value:
+        container[key] = value
+        mark_state_dirty()
+
+
 def save_state(state: Dict):
     """
     Save application state with atomic writes and backup rotation.
     
+    Nothing is written when the serialized state matches the last save of
+    this session, and backups rotate at most once per BACKUP_INTERVAL.
+    
     Args:
         state: Application state dictionary
     """
     try:
+        serializable, matrices = _pack_banks(state)
+        payload = _dumps_state(serializable)
+        
+        state_digest = hashlib.blake2b(payload, digest_size=16).digest()
+        vectors_hash = hashlib.blake2b(digest_size=16)
+        for name, matrix in matrices.items():
+            vectors_hash.update(name.encode('utf-8'))
+            vectors_hash.update(matrix.tobytes())
+        vectors_digest = vectors_hash.digest()
+        
+        # Skip all disk I/O on idle saves
+        if (st.session_state.get('_autosave_digest') == state_digest
+                and st.session_state.get('_vectors_digest') == vectors_digest):
+            st.session_state['_state_dirty'] = False
+            return
+        
         # Ensure autosave directory exists
         os.makedirs('autosave', exist_ok=True)
         
-        # Rotate backups
-        if os.path.exists(AUTOSAVE_PATH):
+        # Sample vectors go to a binary sidecar instead of JSON float lists.
+        # Whether it needs rewriting is decided from the file on disk, since
+        # other sessions write the same autosave files.
+        if _sidecar_digest() != vectors_digest:
+            with tempfile.NamedTemporaryFile(mode='wb', dir='autosave', suffix='.npz', delete=False) as tmp:
+                np.savez(tmp, **matrices, **{SIDECAR_DIGEST_KEY: np.frombuffer(vectors_digest, dtype=np.uint8)})
+                tmp_path = tmp.name
+            
+            os.replace(tmp_path, VECTORS_PATH)
+        st.session_state['_vectors_digest'] = vectors_digest
+        
+        # Atomic write: write to temp file first so a full copy exists
+        # before any existing file is moved
+        with tempfile.NamedTemporaryFile(mode='wb', dir='autosave', delete=False) as tmp:
+            tmp.write(payload)
+            tmp_path = tmp.name
+        
+        # Rotate backups, debounced so they don't all capture one burst of edits.
+        # Backups are immutable snapshots, so renames replace byte copies.
+        now = time.monotonic()
+        last_backup = st.session_state.get('_last_backup_time')
+        if os.path.exists(AUTOSAVE_PATH) and (last_backup is None or now - last_backup >= BACKUP_INTERVAL):
             for i in range(BACKUP_COUNT - 1, 0, -1):
                 old_backup = f"{AUTOSAVE_PATH}.bak{i}" if i > 1 else f"{AUTOSAVE_PATH}.bak"
                 new_backup = f"{AUTOSAVE_PATH}.bak{i + 1}"
                 if os.path.exists(old_backup):
-                    if os.path.exists(new_backup):
-                        os.remove(new_backup)
-                    shutil.copy2(old_backup, new_backup)
+                    os.replace(old_backup, new_backup)
             
-            # Create .bak from current
-            shutil.copy2(AUTOSAVE_PATH, f"{AUTOSAVE_PATH}.bak")
-        
-        # Atomic write: write to temp file, then rename
-        with tempfile.NamedTemporaryFile(mode='w', dir='autosave', delete=False) as tmp:
-            json.dump(state, tmp, indent=2)
-            tmp_path = tmp.name
+            # Current save becomes .bak
+            os.replace(AUTOSAVE_PATH, f"{AUTOSAVE_PATH}.bak")
+            st.session_state['_last_backup_time'] = now
         
-        shutil.move(tmp_path, AUTOSAVE_PATH)
+        os.replace(tmp_path, AUTOSAVE_PATH)
+        st.session_state['_autosave_digest'] = state_digest
+        st.session_state['_state_dirty'] = False
         
     except Exception as e:
         st.error(f"Failed to save state: {str(e)}")
@@ -417,8 +952,8 @@ def load_state() -> Dict:
     """
     try:
         if os.path.exists(AUTOSAVE_PATH):
-            with open(AUTOSAVE_PATH, 'r') as f:
-                return json.load(f)
+            with open(AUTOSAVE_PATH, 'rb') as f:
+                return _unpack_banks(_loads_state(f.read()), _load_sidecar())
     except Exception as e:
         st.warning(f"Failed to load state: {str(e)}")
         # Try backups
@@ -426,9 +961,9 @@ def load_state() -> Dict:
             backup_path = f"{AUTOSAVE_PATH}.bak{i}" if i > 1 else f"{AUTOSAVE_PATH}.bak"
             try:
                 if os.path.exists(backup_path):
-                    with open(backup_path, 'r') as f:
+                    with open(backup_path, 'rb') as f:
                         st.info(f"Loaded from backup {i}")
-                        return json.load(f)
+                        return _unpack_banks(_loads_state(f.read()))
             except:
                 continue
     
@@ -452,7 +987,8 @@ def initialize_voice_bible() -> Dict:
         'match_my_style': '',
         'voice_lock': '',
         'technical': {'pov': 'Close Third', 'tense': 'Past'},
-        'style_banks': {lane: [] for lane in LANES},
+        # Lane banks are created on first use; see lane_bank()
+        'style_banks': {},
         'voice_vault': {}
     }
 
@@ -463,19 +999,92 @@ def initialize_voice_bible() -> Dict:
 
 def create_project(title: str, bay: str = 'NEW') -> Dict:
     """Create a new project."""
-    project_id = f"proj_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{hash(title) % 10000}"
+    now = datetime.now()
+    # Deterministic suffix; str hash() is salted per process
+    suffix = hashlib.blake2b(title.encode('utf-8'), digest_size=3).hexdigest()
+    project_id = f"proj_{now.strftime('%Y%m%d_%H%M%S')}_{suffix}"
     return {
         'id': project_id,
         'title': title,
         'draft': '',
         'bay': bay,
-        'created': datetime.now().isoformat(),
-        'modified': datetime.now().isoformat(),
+        'created': now.isoformat(),
+        'modified': now.isoformat(),
         'story_bible': {section: '' for section in STORY_BIBLE_SECTIONS},
+        '_has_bible': False,
         'tool_output': ''
     }
 
 
+def set_story_bible_section(project: Dict, section: str, content: str):
+    """Update a Story Bible section and the project's cached has-content flag."""
+    story_bible = project['story_bible']
+    if story_bible.get(section) == content:
+        return
+    
+    story_bible[section] = content
+    mark_state_dirty()
+    project['_has_bible'] = any(story_bible.get(s, '').strip() for s in STORY_BIBLE_SECTIONS)
+
+
+def has_story_bible(project: Dict) -> bool:
+    """Whether any Story Bible section has content."""
+    has_bible = project.get('_has_bible')
+    if has_bible is None:
+        # Projects saved or imported before the flag existed
+        story_bible = project.get('story_bible', {})
+        has_bible = any(story_bible.get(s, '').strip() for s in STORY_BIBLE_SECTIONS)
+    return has_bible
+
+
+def draft_word_count(project: Dict) -> int:
+    """
+    Word count of a project's draft, recounted only when the draft changes.
+    
+    The header shows the count on every rerun; the last count is kept per
+    project in session_state, and an unchanged draft is recognised by an
+    identity or memcmp comparison instead of re-splitting the text.
+    """
+    counts = st.session_state.setdefault('_word_counts', {})
+    draft = project['draft']
+    cached = counts.get(project['id'])
+    if cached is None or cached[0] != draft:
+        cached = (draft, len(draft.split()))
+        counts[project['id']] = cached
+    return cached[1]
+
+
+def replace_draft_tail(project: Dict, keep: int, addition: str):
+    """
+    Replace everything after the first `keep` characters of the draft.
+    
+    A cached word count for the old draft is carried over by counting only
+    the removed and added text, so the next header render doesn't re-split
+    the whole manuscript.
+    
+    Args:
+        project: Project whose draft changes
+        keep: Number of leading characters to keep
+        addition: Text appended after the kept prefix
+    """
+    draft = project['draft']
+    new_draft = draft[:keep] + addition
+    
+    counts = st.session_state.get('_word_counts', {})
+    cached = counts.get(project['id'])
+    if cached is not None and cached[0] == draft:
+        count = cached[1] - len(draft[keep:].split()) + len(addition.split())
+        # A word cut by the boundary was one word before and is two pieces now
+        if 0 < keep < len(draft) and not draft[keep - 1].isspace() and not draft[keep].isspace():
+            count += 1
+        # A prefix word running straight into the addition merges with it
+        if keep > 0 and addition and not draft[keep - 1].isspace() and not addition[0].isspace():
+            count -= 1
+        counts[project['id']] = (new_draft, count)
+    
+    project['draft'] = new_draft
+
+
 def promote_project(project: Dict, current_bay: str) -> str:
     """Promote project to next bay."""
     bay_order = ['NEW', 'ROUGH', 'EDIT', 'FINAL']
@@ -490,15 +1099,31 @@ def promote_project(project: Dict, current_bay: str) -> str:
 # EXPORT FUNCTIONS
 # ============================================================================
 
-def export_as_markdown(project: Dict) -> str:
+def _analyze_draft(draft: str) -> Tuple[List[str], int]:
+    """
+    Split a draft into stripped paragraphs and count its words in one pass.
+    
+    Words never span a blank-line break, so summing per-paragraph counts
+    matches len(draft.split()) without tokenizing the whole draft at once.
+    
+    Returns:
+        (non-empty paragraphs, word count)
+    """
+    paragraphs = [p.strip() for p in draft.split('\n\n') if p.strip()]
+    word_count = sum(len(p.split()) for p in paragraphs)
+    return paragraphs, word_count
+
+
+def export_as_markdown(project: Dict, analysis: Optional[Tuple[List[str], int]] = None) -> str:
     """Export project as Markdown with metadata."""
+    _, word_count = analysis or _analyze_draft(project['draft'])
     lines = []
     lines.append("---")
     lines.append(f"title: {project['title']}")
     lines.append(f"created: {project['created']}")
     lines.append(f"modified: {project['modified']}")
     lines.append(f"bay: {project['bay']}")
-    lines.append(f"word_count: {len(project['draft'].split())}")
+    lines.append(f"word_count: {word_count}")
     lines.append("---")
     lines.append("")
     lines.append(f"# {project['title']}")
@@ -507,10 +1132,10 @@ def export_as_markdown(project: Dict) -> str:
     return '\n'.join(lines)
 
 
-def export_as_manuscript(project: Dict) -> str:
+def export_as_manuscript(project: Dict, analysis: Optional[Tuple[List[str], int]] = None) -> str:
     """Export project in manuscript standard format."""
+    paragraphs, word_count = analysis or _analyze_draft(project['draft'])
     lines = []
-    word_count = len(project['draft'].split())
     
     # Title page
     lines.append(f"{word_count} words")
@@ -523,23 +1148,19 @@ def export_as_manuscript(project: Dict) -> str:
     lines.append("")
     
     # Content with proper indentation
-    paragraphs = project['draft'].split('\n\n')
     for para in paragraphs:
-        if para.strip():
-            lines.append(f"    {para.strip()}")
-            lines.append("")
+        lines.append(f"    {para}")
+        lines.append("")
     
     return '\n'.join(lines)
 
 
-def export_as_html(project: Dict) -> str:
-    """Export project as HTML (eBook format)."""
-    html = f"""<!DOCTYPE html>
+_HTML_HEADER = """<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{project['title']}</title>
+    <title>{title}</title>
     <style>
         body {{
             font-family: 'Georgia', serif;
@@ -560,27 +1181,66 @@ def export_as_html(project: Dict) -> str:
     </style>
 </head>
 <body>
-    <h1>{project['title']}</h1>
+    <h1>{title}</h1>
 """
+
+_HTML_FOOTER = """</body>
+</html>"""
+
+
+def export_as_html(project: Dict, analysis: Optional[Tuple[List[str], int]] = None) -> str:
+    """Export project as HTML (eBook format)."""
+    paragraphs, _ = analysis or _analyze_draft(project['draft'])
+    parts = [_HTML_HEADER.format(title=html.escape(project['title'], quote=False))]
+    parts.extend(f"    <p>{html.escape(para, quote=False)}</p>\n" for para in paragraphs)
     
-    paragraphs = project['draft'].split('\n\n')
-    for para in paragraphs:
-        if para.strip():
-            html += f"    <p>{para.strip()}</p>\n"
+    parts.append(_HTML_FOOTER)
+    return ''.join(parts)
+
+
+_EXPORTERS = {
+    'markdown': export_as_markdown,
+    'manuscript': export_as_manuscript,
+    'html': export_as_html,
+}
+
+
+def _export_cache_key(project: Dict) -> bytes:
+    """Digest of every project field the exporters read."""
+    digest = hashlib.blake2b(digest_size=16)
+    for field in ('title', 'created', 'modified', 'bay', 'draft'):
+        digest.update(str(project[field]).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.digest()
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _cached_export(fmt: str, cache_key: bytes, _project: Dict) -> str:
+    """Render an export once per project revision; `_project` is left out of Streamlit's hashing."""
+    return _EXPORTERS[fmt](_project)
+
+
+def export_project(project: Dict, fmt: str) -> str:
+    """
+    Export a project, reusing the last rendering while its content is unchanged.
     
-    html += """</body>
-</html>"""
+    Args:
+        project: Project to export
+        fmt: One of 'markdown', 'manuscript' or 'html'
     
-    return html
+    Returns:
+        Rendered export
+    """
+    return _cached_export(fmt, _export_cache_key(project), project)
 
 
 # ============================================================================
 # STREAMLIT UI
 # ============================================================================
 
-def apply_custom_css():
-    """Apply Olivetti aesthetic."""
-    st.markdown(f"""
+# Built once from the palette; main() still emits it on every rerun because
+# Streamlit drops any element a rerun does not render again
+_CSS_HTML = f"""
         <style>
         @import url('https://fonts.googleapis.com/css2?family=IBM+Plex+Mono:wght@400;700&family=Libre+Baskerville:ital,wght@0,400;0,700;1,400&display=swap');
         
@@ -636,18 +1296,25 @@ def apply_custom_css():
             margin: 1em 0;
         }}
         </style>
-    """, unsafe_allow_html=True)
+"""
 
 
-def render_status_display(state: Dict):
-    """Render Voice Bible status display."""
-    vb = state['voice_bible']
-    
+def apply_custom_css():
+    """Apply Olivetti aesthetic."""
+    st.markdown(_CSS_HTML, unsafe_allow_html=True)
+
+
+STATUS_SEPARATOR = " \u2022 "
+_INTENSITY_LABELS = ("AI:LOW", "AI:MED", "AI:HIGH")
+
+
+def _status_text(vb: Dict) -> str:
+    """One-line summary of the active Voice Bible settings."""
     status_parts = []
     
     # AI Intensity
-    intensity_level = "LOW" if vb['ai_intensity'] < 0.33 else "MED" if vb['ai_intensity'] < 0.67 else "HIGH"
-    status_parts.append(f"AI:{intensity_level}")
+    ai_intensity = vb['ai_intensity']
+    status_parts.append(_INTENSITY_LABELS[(ai_intensity >= 0.33) + (ai_intensity >= 0.67)])
     
     # Style
     if vb['style_engine']['enabled']:
@@ -664,8 +1331,15 @@ def render_status_display(state: Dict):
     # Technical
     status_parts.append(f"Tech:{vb['technical']['pov']}/{vb['technical']['tense']}")
     
-    status_text = " • ".join(status_parts)
-    st.markdown(f'<div class="status-display">{status_text}</div>', unsafe_allow_html=True)
+    return STATUS_SEPARATOR.join(status_parts)
+
+
+def render_status_display(state: Dict):
+    """Render Voice Bible status display."""
+    # Voice names are user input, so escape before embedding in HTML.
+    # st.html inserts the element as-is, skipping the markdown pipeline.
+    status_text = html.escape(_status_text(state['voice_bible']), quote=False)
+    st.html(f'<div class="status-display">{status_text}</div>')
 
 
 def render_bay_buttons(state: Dict):
@@ -690,6 +1364,23 @@ def render_bay_buttons(state: Dict):
                 save_state(state)
 
 
+def _project_widget_key(project: Dict, name: str) -> str:
+    """
+    Widget key scoped to one project.
+    
+    Keyed widgets keep their value across reruns, so a key shared between
+    projects would copy one project's text into another on a bay switch.
+    """
+    return f"{name}_{project['id']}"
+
+
+def _on_draft_change(project: Dict, editor_key: str):
+    """Copy an edited draft into its project before the rerun starts."""
+    project['draft'] = st.session_state[editor_key]
+    project['modified'] = datetime.now().isoformat()
+    mark_state_dirty()
+
+
 def render_action_bar(state: Dict, project: Dict):
     """Render bottom action bar with 9 buttons."""
     st.markdown("### Writing Desk")
@@ -739,9 +1430,12 @@ def execute_action(state: Dict, project: Dict, action: str):
         action, lane, project, state['voice_bible']
     )
     
-    # Call OpenAI
-    with st.spinner(f"Executing {action}..."):
-        result = call_openai(system_prompt, user_prompt, temperature)
+    # Show the completion as it streams in; a stream cut short changes nothing
+    try:
+        result = st.write_stream(call_openai_stream(system_prompt, user_prompt, temperature, action=action))
+    except Exception as e:
+        st.error(f"OpenAI API error: {str(e)}")
+        return
     
     if result:
         # Tool outputs go to separate panel
@@ -749,215 +1443,275 @@ def execute_action(state: Dict, project: Dict, action: str):
             project['tool_output'] = result
         else:
             # Content actions modify draft
+            draft = project['draft']
             if action == 'Write':
-                project['draft'] += '\n\n' + result
+                replace_draft_tail(project, len(draft), '\n\n' + result)
             elif action == 'Rephrase':
-                # Replace last sentence
-                sentences = re.split(r'[.!?]+', project['draft'])
-                if len(sentences) > 1:
-                    project['draft'] = '.'.join(sentences[:-1]) + '.' + result
-                else:
-                    project['draft'] = result
-            else:
+                # Replace last sentence: keep everything through the final terminator
+                end = max(draft.rfind(mark) for mark in SENTENCE_TERMINATORS)
+                replace_draft_tail(project, end + 1, result)
+            elif len(draft) > 500:
                 # Replace last portion
-                project['draft'] = project['draft'][:-500] + '\n\n' + result if len(project['draft']) > 500 else result
+                replace_draft_tail(project, len(draft) - 500, '\n\n' + result)
+            else:
+                replace_draft_tail(project, 0, result)
         
         project['modified'] = datetime.now().isoformat()
         save_state(state)
+        # Drop the editor's state so the rerun shows the updated draft
+        st.session_state.pop(_project_widget_key(project, 'draft_editor'), None)
         st.success(f"{action} completed!")
         st.rerun()
 
 
+def _story_bible_prompt(project: Dict, section: str) -> Tuple[str, str, float, str]:
+    """Generation request for one Story Bible section."""
+    system_prompt = f"You are an expert writing coach. Generate {section} content for a story."
+    user_prompt = f"Based on this context:\n{project['draft'][:500]}\n\nGenerate {section}:"
+    return system_prompt, user_prompt, 0.7, f"Generate {section}"
+
+
 def render_story_bible(state: Dict, project: Dict):
     """Render Story Bible interface."""
     st.markdown("### Story Bible")
     
+    # Fill every empty section with one concurrent batch
+    empty_sections = [
+        section for section in STORY_BIBLE_SECTIONS
+        if not project['story_bible'].get(section, '').strip()
+    ]
+    if st.button("Generate All Empty Sections", key="gen_all_sections", disabled=not empty_sections):
+        with st.spinner(f"Generating {len(empty_sections)} sections..."):
+            results = call_openai_batch([_story_bible_prompt(project, s) for s in empty_sections])
+        
+        if any(results):
+            for section, result in zip(empty_sections, results):
+                if result:
+                    set_story_bible_section(project, section, result)
+                    st.session_state.pop(_project_widget_key(project, f"sb_{section}"), None)
+            save_state(state)
+            st.rerun()
+    
     for section in STORY_BIBLE_SECTIONS:
         with st.expander(section):
             content = st.text_area(
                 f"{section} content",
                 value=project['story_bible'].get(section, ''),
                 height=150,
-                key=f"sb_{section}",
+                key=_project_widget_key(project, f"sb_{section}"),
                 label_visibility="collapsed"
             )
-            project['story_bible'][section] = content
+            set_story_bible_section(project, section, content)
             
             col1, col2 = st.columns(2)
             with col1:
                 if st.button(f"Generate {section}", key=f"gen_{section}"):
                     # Generate content for this section
-                    system_prompt = f"You are an expert writing coach. Generate {section} content for a story."
-                    user_prompt = f"Based on this context:\n{project['draft'][:500]}\n\nGenerate {section}:"
-                    
                     with st.spinner(f"Generating {section}..."):
-                        result = call_openai(system_prompt, user_prompt, 0.7)
+                        result = call_openai(*_story_bible_prompt(project, section))
                     
                     if result:
-                        project['story_bible'][section] = result
+                        set_story_bible_section(project, section, result)
+                        # Drop the widget's state so it picks up the new value
+                        st.session_state.pop(_project_widget_key(project, f"sb_{section}"), None)
                         save_state(state)
                         st.rerun()
             
             with col2:
                 if st.button(f"Clear {section}", key=f"clear_{section}"):
-                    project['story_bible'][section] = ''
+                    set_story_bible_section(project, section, '')
+                    st.session_state.pop(_project_widget_key(project, f"sb_{section}"), None)
                     save_state(state)
                     st.rerun()
 
 
+@st.fragment
 def render_voice_bible(state: Dict):
-    """Render Voice Bible controls."""
+    """
+    Render Voice Bible controls.
+    
+    Settings sit in a form, so adjusting them causes no reruns until they
+    are saved. Sample banks have their own buttons outside the form. The
+    panel runs as a fragment that saves its own changes, and asks for a
+    full rerun only when the status line at the top of the page changes.
+    """
     st.markdown("### Voice Bible")
     
     vb = state['voice_bible']
-    
-    # AI Intensity
-    with st.expander("AI Intensity", expanded=False):
-        vb['ai_intensity'] = st.slider(
-            "Creativity Level",
-            0.0, 1.0, vb['ai_intensity'],
-            help="Controls creative risk-taking"
-        )
-    
-    # Style Engine
-    with st.expander("Style Engine", expanded=False):
-        vb['style_engine']['enabled'] = st.checkbox(
-            "Enable Style Engine",
-            value=vb['style_engine']['enabled']
-        )
-        vb['style_engine']['style'] = st.selectbox(
-            "Style",
-            STYLES,
-            index=STYLES.index(vb['style_engine']['style'])
-        )
-        vb['style_engine']['intensity'] = st.slider(
-            "Style Intensity",
-            0.0, 1.0, vb['style_engine']['intensity']
-        )
+    status_before = _status_text(vb)
+    
+    # Initialize voice_vault if not exists
+    if 'voice_vault' not in vb:
+        vb['voice_vault'] = {}
+    
+    # Widgets in a form report their last submitted values, so these updates
+    # only change anything on the run after Save is clicked
+    with st.form("voice_bible_form", clear_on_submit=False, border=False):
+        # AI Intensity
+        with st.expander("AI Intensity", expanded=False):
+            _update_setting(vb, 'ai_intensity', st.slider(
+                "Creativity Level",
+                0.0, 1.0, vb['ai_intensity'],
+                help="Controls creative risk-taking"
+            ))
         
-        # Style Banks
-        st.markdown("**Style Banks**")
+        # Style Engine
+        with st.expander("Style Engine", expanded=False):
+            _update_setting(vb['style_engine'], 'enabled', st.checkbox(
+                "Enable Style Engine",
+                value=vb['style_engine']['enabled']
+            ))
+            _update_setting(vb['style_engine'], 'style', st.selectbox(
+                "Style",
+                STYLES,
+                index=_STYLE_INDEX.get(vb['style_engine']['style'], 0)
+            ))
+            _update_setting(vb['style_engine'], 'intensity', st.slider(
+                "Style Intensity",
+                0.0, 1.0, vb['style_engine']['intensity']
+            ))
+        
+        # Genre Intelligence
+        with st.expander("Genre Intelligence", expanded=False):
+            _update_setting(vb['genre_intelligence'], 'enabled', st.checkbox(
+                "Enable Genre Intelligence",
+                value=vb['genre_intelligence']['enabled']
+            ))
+            _update_setting(vb['genre_intelligence'], 'genre', st.selectbox(
+                "Genre",
+                GENRES,
+                index=_GENRE_INDEX.get(vb['genre_intelligence']['genre'], 0)
+            ))
+            _update_setting(vb['genre_intelligence'], 'intensity', st.slider(
+                "Genre Intensity",
+                0.0, 1.0, vb['genre_intelligence']['intensity']
+            ))
+        
+        # Trained Voice
+        with st.expander("Trained Voice", expanded=False):
+            _update_setting(vb['trained_voice'], 'enabled', st.checkbox(
+                "Enable Trained Voice",
+                value=vb['trained_voice']['enabled']
+            ))
+            
+            # Select voice; the built-in voices also appear in the vault once used
+            voice_index = {name: i for i, name in enumerate(dict.fromkeys(VOICES + list(vb['voice_vault'])))}
+            
+            _update_setting(vb['trained_voice'], 'voice', st.selectbox(
+                "Voice",
+                list(voice_index),
+                index=voice_index.get(vb['trained_voice'].get('voice', 'None'), 0)
+            ))
+        
+        # Match My Style
+        with st.expander("Match My Style", expanded=False):
+            _update_setting(vb, 'match_my_style', st.text_area(
+                "Paste sample text",
+                value=vb['match_my_style'],
+                height=150,
+                help="One-shot style transfer"
+            ))
+        
+        # Voice Lock
+        with st.expander("Voice Lock (Hard Constraints)", expanded=False):
+            _update_setting(vb, 'voice_lock', st.text_area(
+                "Mandatory rules",
+                value=vb['voice_lock'],
+                height=150,
+                help="MANDATORY enforcement, highest priority"
+            ))
+        
+        # Technical Controls
+        with st.expander("Technical Controls", expanded=False):
+            _update_setting(vb['technical'], 'pov', st.selectbox(
+                "POV",
+                POVS,
+                index=_POV_INDEX.get(vb['technical']['pov'], 0)
+            ))
+            _update_setting(vb['technical'], 'tense', st.selectbox(
+                "Tense",
+                TENSES,
+                index=_TENSE_INDEX.get(vb['technical']['tense'], 0)
+            ))
+        
+        # Save changes
+        if st.form_submit_button("Save Voice Bible Settings"):
+            save_state(state)
+            st.success("Voice Bible settings saved!")
+    
+    # Style Banks
+    with st.expander("Style Banks", expanded=False):
         lane = st.selectbox("Lane for samples", LANES, key="style_lane")
         sample_text = st.text_area("Add training sample", height=100, key="style_sample")
         if st.button("Add to Style Bank"):
             if sample_text:
-                vector = text_to_hash_vector(sample_text)
-                vb['style_banks'][lane].append({
-                    'text': sample_text,
-                    'vector': vector
-                })
                 # Limit to 250 samples
-                if len(vb['style_banks'][lane]) > 250:
-                    vb['style_banks'][lane] = vb['style_banks'][lane][-250:]
+                lane_bank(vb['style_banks'], lane).add(sample_text, limit=250)
                 save_state(state)
                 st.success(f"Added to {lane} Style Bank")
         
         st.text(f"Samples in {lane}: {len(vb['style_banks'].get(lane, []))}")
     
-    # Genre Intelligence
-    with st.expander("Genre Intelligence", expanded=False):
-        vb['genre_intelligence']['enabled'] = st.checkbox(
-            "Enable Genre Intelligence",
-            value=vb['genre_intelligence']['enabled']
-        )
-        vb['genre_intelligence']['genre'] = st.selectbox(
-            "Genre",
-            GENRES,
-            index=GENRES.index(vb['genre_intelligence']['genre'])
-        )
-        vb['genre_intelligence']['intensity'] = st.slider(
-            "Genre Intensity",
-            0.0, 1.0, vb['genre_intelligence']['intensity']
-        )
-    
-    # Trained Voice (Voice Vault)
-    with st.expander("Trained Voice (Voice Vault)", expanded=False):
-        vb['trained_voice']['enabled'] = st.checkbox(
-            "Enable Trained Voice",
-            value=vb['trained_voice']['enabled']
-        )
-        
-        # Initialize voice_vault if not exists
-        if 'voice_vault' not in vb:
-            vb['voice_vault'] = {}
-        
+    # Voice Vault
+    with st.expander("Voice Vault", expanded=False):
         # Create new voice
         new_voice = st.text_input("Create new voice", key="new_voice")
         if st.button("Create Voice") and new_voice:
-            vb['voice_vault'][new_voice] = {lane: [] for lane in LANES}
-            save_state(state)
-            st.success(f"Created voice: {new_voice}")
-        
-        # Select voice
-        available_voices = ['None', 'Voice A', 'Voice B'] + list(vb['voice_vault'].keys())
-        current_voice = vb['trained_voice'].get('voice', 'None')
-        if current_voice not in available_voices:
-            current_voice = 'None'
-        
-        vb['trained_voice']['voice'] = st.selectbox(
-            "Voice",
-            available_voices,
-            index=available_voices.index(current_voice)
-        )
+            if new_voice in vb['voice_vault']:
+                st.warning(f"Voice already exists: {new_voice}")
+            else:
+                vb['voice_vault'][new_voice] = {}
+                save_state(state)
+                st.success(f"Created voice: {new_voice}")
         
-        # Add samples to voice
+        # Add samples to the selected voice
         if vb['trained_voice']['voice'] != 'None':
             voice_name = vb['trained_voice']['voice']
             if voice_name not in vb['voice_vault']:
-                vb['voice_vault'][voice_name] = {lane: [] for lane in LANES}
+                vb['voice_vault'][voice_name] = {}
+                mark_state_dirty()
             
             lane = st.selectbox("Lane for voice samples", LANES, key="voice_lane")
-            sample_text = st.text_area("Add voice sample", height=100, key="voice_sample")
+            sample_text = st.text_area(f"Add sample to {voice_name}", height=100, key="voice_sample")
             if st.button("Add to Voice Vault"):
                 if sample_text:
-                    vector = text_to_hash_vector(sample_text)
-                    vb['voice_vault'][voice_name][lane].append({
-                        'text': sample_text,
-                        'vector': vector
-                    })
                     # Limit to 60 samples per lane
-                    if len(vb['voice_vault'][voice_name][lane]) > 60:
-                        vb['voice_vault'][voice_name][lane] = vb['voice_vault'][voice_name][lane][-60:]
+                    lane_bank(vb['voice_vault'][voice_name], lane).add(sample_text, limit=60)
                     save_state(state)
                     st.success(f"Added to {voice_name} Voice Vault")
             
             st.text(f"Samples in {lane}: {len(vb['voice_vault'][voice_name].get(lane, []))}")
+        else:
+            st.caption("Select a voice under Trained Voice to add samples.")
     
-    # Match My Style
-    with st.expander("Match My Style", expanded=False):
-        vb['match_my_style'] = st.text_area(
-            "Paste sample text",
-            value=vb['match_my_style'],
-            height=150,
-            help="One-shot style transfer"
-        )
-    
-    # Voice Lock
-    with st.expander("Voice Lock (Hard Constraints)", expanded=False):
-        vb['voice_lock'] = st.text_area(
-            "Mandatory rules",
-            value=vb['voice_lock'],
-            height=150,
-            help="MANDATORY enforcement, highest priority"
-        )
-    
-    # Technical Controls
-    with st.expander("Technical Controls", expanded=False):
-        vb['technical']['pov'] = st.selectbox(
-            "POV",
-            POVS,
-            index=POVS.index(vb['technical']['pov'])
-        )
-        vb['technical']['tense'] = st.selectbox(
-            "Tense",
-            TENSES,
-            index=TENSES.index(vb['technical']['tense'])
-        )
-    
-    # Save changes
-    if st.button("Save Voice Bible Settings"):
+    # A fragment rerun skips the end-of-run autosave in main()
+    if st.session_state.get('_state_dirty'):
         save_state(state)
-        st.success("Voice Bible settings saved!")
+    
+    if _status_text(vb) != status_before:
+        st.rerun()
+
+
+def _search_index(project: Dict) -> List[Tuple[str, str]]:
+    """
+    Case-folded copies of the draft and Story Bible sections for /find:.
+    
+    The copies are kept per project in session_state and rebuilt only when
+    a source text changes, so repeated searches (the command input keeps its
+    value across reruns) don't refold the whole draft each time.
+    
+    Returns:
+        (location, folded text) pairs, draft first
+    """
+    sources = [('draft', project['draft'])]
+    sources.extend((section, project['story_bible'].get(section, '')) for section in STORY_BIBLE_SECTIONS)
+    
+    indexes = st.session_state.setdefault('_search_index', {})
+    cached = indexes.get(project['id'])
+    if cached is None or cached[0] != sources:
+        cached = (sources, [(location, text.casefold()) for location, text in sources])
+        indexes[project['id']] = cached
+    return cached[1]
 
 
 def process_command(state: Dict, command: str):
@@ -998,20 +1752,14 @@ def process_command(state: Dict, command: str):
     
     elif command.startswith('/find:'):
         # Search across Story Bible and draft
-        search_term = command[6:].strip().lower()
+        search_term = command[6:].strip().casefold()
         if search_term and state['current_project_id']:
             project = state['projects'][state['current_project_id']]
-            results = []
-            
-            # Search draft
-            if search_term in project['draft'].lower():
-                results.append(f"Found in draft")
-            
-            # Search Story Bible
-            for section in STORY_BIBLE_SECTIONS:
-                content = project['story_bible'].get(section, '')
-                if search_term in content.lower():
-                    results.append(f"Found in {section}")
+            results = [
+                f"Found in {location}"
+                for location, text in _search_index(project)
+                if search_term in text
+            ]
             
             if results:
                 st.info("Search results:\n" + "\n".join(results))
@@ -1029,9 +1777,18 @@ def main():
     
     apply_custom_css()
     
+    # Warm the API connection before the first action; skipped without a key
+    try:
+        if 'OPENAI_API_KEY' in st.secrets:
+            _prewarm_openai()
+    except Exception:
+        pass
+    
     # Load state
     if 'state' not in st.session_state:
         st.session_state.state = load_state()
+        # Write once per session so a new or backup-restored state reaches the primary file
+        mark_state_dirty()
     
     state = st.session_state.state
     
@@ -1060,22 +1817,20 @@ def main():
         
         if project:
             st.markdown(f"### {project['title']}")
-            st.markdown(f"*Bay: {project['bay']} | Words: {len(project['draft'].split())} | Lane: {detect_lane(project['draft'])}*")
+            st.markdown(f"*Bay: {project['bay']} | Words: {draft_word_count(project)} | Lane: {detect_lane(project['draft'])}*")
             
-            # Draft editor
-            draft = st.text_area(
+            # Draft editor; edits are applied by the callback before the next run
+            editor_key = _project_widget_key(project, 'draft_editor')
+            st.text_area(
                 "Draft",
                 value=project['draft'],
                 height=400,
-                key="draft_editor",
+                key=editor_key,
+                on_change=_on_draft_change,
+                args=(project, editor_key),
                 label_visibility="collapsed"
             )
             
-            if draft != project['draft']:
-                project['draft'] = draft
-                project['modified'] = datetime.now().isoformat()
-                save_state(state)
-            
             # Tool output panel
             if project.get('tool_output'):
                 with st.expander("Tool Output", expanded=True):
@@ -1094,7 +1849,7 @@ def main():
                 
                 with col1:
                     if st.button("Export Markdown"):
-                        md_content = export_as_markdown(project)
+                        md_content = export_project(project, 'markdown')
                         st.download_button(
                             "Download MD",
                             md_content,
@@ -1104,7 +1859,7 @@ def main():
                 
                 with col2:
                     if st.button("Export Manuscript"):
-                        ms_content = export_as_manuscript(project)
+                        ms_content = export_project(project, 'manuscript')
                         st.download_button(
                             "Download TXT",
                             ms_content,
@@ -1114,7 +1869,7 @@ def main():
                 
                 with col3:
                     if st.button("Export HTML"):
-                        html_content = export_as_html(project)
+                        html_content = export_project(project, 'html')
                         st.download_button(
                             "Download HTML",
                             html_content,
@@ -1124,7 +1879,7 @@ def main():
                 
                 with col4:
                     if st.button("Export Project JSON"):
-                        json_content = json.dumps(project, indent=2)
+                        json_content = _dumps_state(project)
                         st.download_button(
                             "Download JSON",
                             json_content,
@@ -1147,7 +1902,7 @@ def main():
             uploaded_file = st.file_uploader("Import project JSON", type=['json'])
             if uploaded_file:
                 try:
-                    imported = json.load(uploaded_file)
+                    imported = _loads_state(uploaded_file.getvalue())
                     if 'id' in imported and 'title' in imported:
                         # Import to current bay
                         imported['bay'] = state['current_bay']
@@ -1160,8 +1915,9 @@ def main():
                 except Exception as e:
                     st.error(f"Import failed: {str(e)}")
     
-    # Auto-save on any change
-    save_state(state)
+    # Auto-save only when this run changed something
+    if st.session_state.get('_state_dirty'):
+        save_state(state)
 
 
 if __name__ == "__main__":
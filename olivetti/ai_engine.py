@@ -1,22 +1,190 @@
 """AI engine for text generation with support for multiple providers."""
 
 import os
-from typing import Optional, List, Dict, Any
+import json
+import time
+import itertools
+import importlib
+import threading
+from typing import Optional, List, Dict, Any, Iterator, Union
 from abc import ABC, abstractmethod
 
+from . import tokens
+
+
+# Keep-alive connection pool sizes
+HTTP_MAX_CONNECTIONS = 20
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+OLLAMA_POOL_CONNECTIONS = 10
+OLLAMA_POOL_MAXSIZE = 20
+
+# How long Ollama keeps the model, and the KV cache of its last prompt, loaded
+# after a request; requests sharing a prompt prefix then skip re-prefilling it
+OLLAMA_KEEP_ALIVE = "10m"
+
+# Retries for failed connections to the Ollama server
+OLLAMA_MAX_RETRIES = 3
+OLLAMA_RETRY_BACKOFF = 0.3
+
+# Seconds to wait for the connection pre-warming request
+PREWARM_TIMEOUT = 2
+
+# Passes over all child engines a MultiEngine makes while they are rate limited
+MULTI_ENGINE_MAX_ROUNDS = 3
+MULTI_ENGINE_RETRY_BACKOFF = 1.0
+
+
+def _import_sdk(name: str):
+    """Import a provider SDK on first use.
+    
+    SDKs are imported lazily so that commands which never generate text do not
+    pay their import cost.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        raise ImportError(
+            f"{name} package not installed. Install with: pip install {name}"
+        )
+
+
+def _pooled_http_client(asynchronous: bool = False):
+    """Create an httpx client that keeps connections alive between requests.
+    
+    Args:
+        asynchronous: Create an httpx.AsyncClient instead
+    
+    Returns:
+        httpx client, or None to let the SDK create its own
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+    
+    client_class = httpx.AsyncClient if asynchronous else httpx.Client
+    return client_class(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        )
+    )
+
+
+async def _close_client(aclient) -> None:
+    """Close an async SDK client (close()) or httpx.AsyncClient (aclose())."""
+    close = getattr(aclient, "aclose", None) or aclient.close
+    await close()
+
+
+def _prewarm_in_background(http_client, url: str) -> None:
+    """Send a HEAD request in a daemon thread to open a pooled connection.
+    
+    The TCP and TLS handshakes then overlap with prompt building instead of
+    delaying the first real request, which reuses the kept-alive connection.
+    
+    Args:
+        http_client: httpx.Client or requests.Session shared with the engine
+        url: Any URL on the provider's host
+    """
+    if http_client is None:
+        return
+    
+    def warm():
+        try:
+            http_client.head(url, timeout=PREWARM_TIMEOUT)
+        except Exception:
+            # Only an optimization; the real request reports any errors
+            pass
+    
+    threading.Thread(target=warm, daemon=True).start()
+
 
 class AIEngine(ABC):
     """Abstract base class for AI providers."""
     
+    # Provider name, as in the api_provider config key
+    provider: Optional[str] = None
+    
     @abstractmethod
     def generate(self, prompt: str, max_tokens: int, temperature: float) -> str:
         """Generate text from prompt."""
         pass
+    
+    def stream(self, prompt: str, max_tokens: int, temperature: float) -> Iterator[str]:
+        """Generate text from prompt, yielding it in pieces as it arrives.
+        
+        Engines without streaming support yield the whole response at once.
+        """
+        yield self.generate(prompt, max_tokens, temperature)
+    
+    async def agenerate(self, prompt: str, max_tokens: int, temperature: float) -> str:
+        """Generate text from prompt without blocking the event loop.
+        
+        Engines without a native async client run `generate` in a worker thread.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.generate, prompt, max_tokens, temperature)
+    
+    def prewarm(self) -> None:
+        """Start opening a connection to the provider in the background.
+        
+        Engines without a pooled connection do nothing.
+        """
+        pass
+    
+    def close(self) -> None:
+        """Release pooled connections."""
+        pass
+    
+    async def aclose(self) -> None:
+        """Release connections held by the async client."""
+        pass
+    
+    async def _async_client(self, create):
+        """Return the async client for the running event loop.
+        
+        Async connection pools are bound to the loop they were created in, so
+        a new client is created whenever the loop changes, and the previous
+        one is closed.
+        
+        Args:
+            create: Callable that builds a new async client
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        old_loop = getattr(self, "_aclient_loop", None)
+        if old_loop is not loop:
+            old_client = getattr(self, "_aclient", None)
+            self._aclient = create()
+            self._aclient_loop = loop
+            if old_client is not None:
+                if old_loop.is_running():
+                    # Still in use on another thread; close it there
+                    asyncio.run_coroutine_threadsafe(_close_client(old_client), old_loop)
+                else:
+                    try:
+                        await _close_client(old_client)
+                    except Exception:
+                        # Its connections belonged to a loop that has closed
+                        pass
+        return self._aclient
+    
+    async def _close_async_client(self) -> None:
+        """Close the async client, if one was created."""
+        aclient = getattr(self, "_aclient", None)
+        self._aclient = None
+        self._aclient_loop = None
+        if aclient is not None:
+            await _close_client(aclient)
 
 
 class OpenAIEngine(AIEngine):
     """OpenAI API engine."""
     
+    provider = "openai"
+    
     def __init__(self, api_key: str, model: str = "gpt-4"):
         """Initialize OpenAI engine.
         
@@ -26,19 +194,62 @@ class OpenAIEngine(AIEngine):
         """
         self.api_key = api_key
         self.model = model
-        
-        try:
-            import openai
-            self.client = openai.OpenAI(api_key=api_key)
-        except ImportError:
-            raise ImportError(
-                "openai package not installed. Install with: pip install openai"
-            )
+        self._client = None
+        self._http_client = None
+    
+    @property
+    def client(self):
+        """OpenAI client, created on first use."""
+        if self._client is None:
+            openai = _import_sdk("openai")
+            self._http_client = _pooled_http_client()
+            self._client = openai.OpenAI(api_key=self.api_key, http_client=self._http_client)
+        return self._client
+    
+    def prewarm(self) -> None:
+        """Open a connection to the API host in the background."""
+        client = self.client
+        _prewarm_in_background(self._http_client, str(client.base_url))
     
     def generate(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> str:
         """Generate text using OpenAI API."""
+        client = self.client
+        try:
+            response = client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=temperature,
+            )
+            return response.choices[0].message.content
+        except Exception as e:
+            raise RuntimeError(f"OpenAI API error: {str(e)}")
+    
+    def stream(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> Iterator[str]:
+        """Stream text using OpenAI API."""
+        client = self.client
         try:
-            response = self.client.chat.completions.create(
+            response = client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+            )
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            raise RuntimeError(f"OpenAI API error: {str(e)}")
+    
+    async def agenerate(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> str:
+        """Generate text using the async OpenAI API."""
+        openai = _import_sdk("openai")
+        aclient = await self._async_client(
+            lambda: openai.AsyncOpenAI(api_key=self.api_key, http_client=_pooled_http_client(True))
+        )
+        try:
+            response = await aclient.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=max_tokens,
@@ -47,11 +258,24 @@ class OpenAIEngine(AIEngine):
             return response.choices[0].message.content
         except Exception as e:
             raise RuntimeError(f"OpenAI API error: {str(e)}")
+    
+    def close(self) -> None:
+        """Release pooled connections."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+            self._http_client = None
+    
+    async def aclose(self) -> None:
+        """Release connections held by the async client."""
+        await self._close_async_client()
 
 
 class AnthropicEngine(AIEngine):
     """Anthropic Claude API engine."""
     
+    provider = "anthropic"
+    
     def __init__(self, api_key: str, model: str = "claude-3-5-sonnet-20241022"):
         """Initialize Anthropic engine.
         
@@ -61,19 +285,60 @@ class AnthropicEngine(AIEngine):
         """
         self.api_key = api_key
         self.model = model
-        
-        try:
-            import anthropic
-            self.client = anthropic.Anthropic(api_key=api_key)
-        except ImportError:
-            raise ImportError(
-                "anthropic package not installed. Install with: pip install anthropic"
-            )
+        self._client = None
+        self._http_client = None
+    
+    @property
+    def client(self):
+        """Anthropic client, created on first use."""
+        if self._client is None:
+            anthropic = _import_sdk("anthropic")
+            self._http_client = _pooled_http_client()
+            self._client = anthropic.Anthropic(api_key=self.api_key, http_client=self._http_client)
+        return self._client
+    
+    def prewarm(self) -> None:
+        """Open a connection to the API host in the background."""
+        client = self.client
+        _prewarm_in_background(self._http_client, str(client.base_url))
     
     def generate(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> str:
         """Generate text using Anthropic API."""
+        client = self.client
+        try:
+            response = client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            return response.content[0].text
+        except Exception as e:
+            raise RuntimeError(f"Anthropic API error: {str(e)}")
+    
+    def stream(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> Iterator[str]:
+        """Stream text using Anthropic API."""
+        client = self.client
+        try:
+            with client.messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                messages=[{"role": "user", "content": prompt}]
+            ) as response:
+                for text in response.text_stream:
+                    yield text
+        except Exception as e:
+            raise RuntimeError(f"Anthropic API error: {str(e)}")
+    
+    async def agenerate(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> str:
+        """Generate text using the async Anthropic API."""
+        anthropic = _import_sdk("anthropic")
+        aclient = await self._async_client(
+            lambda: anthropic.AsyncAnthropic(api_key=self.api_key, http_client=_pooled_http_client(True))
+        )
         try:
-            response = self.client.messages.create(
+            response = await aclient.messages.create(
                 model=self.model,
                 max_tokens=max_tokens,
                 temperature=temperature,
@@ -82,61 +347,296 @@ class AnthropicEngine(AIEngine):
             return response.content[0].text
         except Exception as e:
             raise RuntimeError(f"Anthropic API error: {str(e)}")
+    
+    def close(self) -> None:
+        """Release pooled connections."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+            self._http_client = None
+    
+    async def aclose(self) -> None:
+        """Release connections held by the async client."""
+        await self._close_async_client()
 
 
 class OllamaEngine(AIEngine):
     """Ollama local model engine."""
     
-    def __init__(self, model: str = "llama2", host: str = "http://localhost:11434"):
+    provider = "ollama"
+    
+    def __init__(
+        self,
+        model: str = "llama2",
+        host: str = "http://localhost:11434",
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+    ):
         """Initialize Ollama engine.
         
         Args:
             model: Model name
             host: Ollama server URL
+            keep_alive: How long the server keeps the model loaded between
+                requests (Ollama duration, e.g. "10m")
         """
         self.model = model
         self.host = host
-        
-        try:
-            import requests
-            self.requests = requests
-        except ImportError:
-            raise ImportError(
-                "requests package not installed. Install with: pip install requests"
+        self.keep_alive = keep_alive
+        self._session = None
+    
+    @property
+    def session(self):
+        """Pooled requests session, created on first use."""
+        if self._session is None:
+            requests = _import_sdk("requests")
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            
+            # Reuse connections across calls; only connection failures are retried,
+            # since POST is not an idempotent method for urllib3
+            adapter = HTTPAdapter(
+                pool_connections=OLLAMA_POOL_CONNECTIONS,
+                pool_maxsize=OLLAMA_POOL_MAXSIZE,
+                max_retries=Retry(total=OLLAMA_MAX_RETRIES, backoff_factor=OLLAMA_RETRY_BACKOFF),
             )
+            self._session = requests.Session()
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        return self._session
     
     def generate(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> str:
         """Generate text using Ollama API."""
+        session = self.session
+        try:
+            response = session.post(
+                f"{self.host}/api/generate",
+                json=self._payload(prompt, max_tokens, temperature),
+            )
+            response.raise_for_status()
+            return response.json()["response"]
+        except Exception as e:
+            raise RuntimeError(f"Ollama API error: {str(e)}")
+    
+    def stream(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> Iterator[str]:
+        """Stream text using Ollama API."""
+        payload = self._payload(prompt, max_tokens, temperature)
+        payload["stream"] = True
+        session = self.session
+        try:
+            with session.post(f"{self.host}/api/generate", json=payload, stream=True) as response:
+                response.raise_for_status()
+                # One JSON object per line
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
+        except Exception as e:
+            raise RuntimeError(f"Ollama API error: {str(e)}")
+    
+    async def agenerate(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> str:
+        """Generate text using the Ollama API without blocking the event loop."""
+        aclient = await self._async_client(lambda: _pooled_http_client(True))
+        if aclient is None:
+            # httpx not installed
+            return await super().agenerate(prompt, max_tokens, temperature)
+        
         try:
-            response = self.requests.post(
+            response = await aclient.post(
                 f"{self.host}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": temperature,
-                        "num_predict": max_tokens,
-                    }
-                }
+                json=self._payload(prompt, max_tokens, temperature),
+                timeout=None,
             )
             response.raise_for_status()
             return response.json()["response"]
         except Exception as e:
             raise RuntimeError(f"Ollama API error: {str(e)}")
+    
+    def _payload(self, prompt: str, max_tokens: int, temperature: float) -> Dict[str, Any]:
+        """Build the /api/generate request body."""
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens,
+            }
+        }
+    
+    def close(self) -> None:
+        """Release pooled connections."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+    
+    async def aclose(self) -> None:
+        """Release connections held by the async client."""
+        await self._close_async_client()
+
+
+def _is_rate_limited(error: BaseException) -> bool:
+    """Check whether an API error (or the error it wraps) is an HTTP 429."""
+    while error is not None:
+        status = getattr(error, "status_code", None)
+        if status is None:
+            status = getattr(getattr(error, "response", None), "status_code", None)
+        if status == 429:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Get the seconds to wait from a rate-limit error's Retry-After header."""
+    while error is not None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        if headers is not None and headers.get("retry-after"):
+            try:
+                return float(headers["retry-after"])
+            except ValueError:
+                # An HTTP date; fall back to the limiter's own backoff
+                return None
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class MultiEngine(AIEngine):
+    """Spread requests across several engines in round-robin order.
+    
+    Each child engine can use its own API key, model or provider, so
+    throughput is bounded by the sum of their rate limits. A rate-limited
+    request is retried on the next engine.
+    """
+    
+    def __init__(self, engines: List[AIEngine]):
+        """Initialize multi-engine.
+        
+        Args:
+            engines: Child engines to dispatch to
+        """
+        if not engines:
+            raise ValueError("MultiEngine needs at least one engine")
+        self.engines = engines
+        # Inputs are sized for the smallest context window of any child
+        self.model = min(
+            (getattr(engine, "model", None) for engine in engines),
+            key=tokens.context_limit,
+        )
+        self._max_attempts = len(engines) * MULTI_ENGINE_MAX_ROUNDS
+        self._cycle = itertools.cycle(engines)
+        self._lock = threading.Lock()
+    
+    def _next_engine(self) -> AIEngine:
+        """Pick the next engine in rotation."""
+        with self._lock:
+            return next(self._cycle)
+    
+    def _backoff(self, attempt: int) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to give up.
+        
+        Waits only after every engine has been tried in the current round.
+        """
+        attempt += 1
+        if attempt >= self._max_attempts:
+            return None
+        if attempt % len(self.engines):
+            return 0
+        return MULTI_ENGINE_RETRY_BACKOFF * 2 ** (attempt // len(self.engines) - 1)
+    
+    def generate(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> str:
+        """Generate text with the next engine, rotating past rate limits."""
+        for attempt in range(self._max_attempts):
+            try:
+                return self._next_engine().generate(prompt, max_tokens, temperature)
+            except Exception as e:
+                delay = self._backoff(attempt)
+                if delay is None or not _is_rate_limited(e):
+                    raise
+                time.sleep(delay)
+    
+    def stream(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> Iterator[str]:
+        """Stream text from the next engine.
+        
+        A rate-limited request is retried only if nothing was yielded yet.
+        """
+        for attempt in range(self._max_attempts):
+            started = False
+            try:
+                for chunk in self._next_engine().stream(prompt, max_tokens, temperature):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                delay = self._backoff(attempt)
+                if started or delay is None or not _is_rate_limited(e):
+                    raise
+                time.sleep(delay)
+    
+    async def agenerate(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> str:
+        """Generate text with the next engine without blocking the event loop."""
+        import asyncio
+        for attempt in range(self._max_attempts):
+            try:
+                return await self._next_engine().agenerate(prompt, max_tokens, temperature)
+            except Exception as e:
+                delay = self._backoff(attempt)
+                if delay is None or not _is_rate_limited(e):
+                    raise
+                await asyncio.sleep(delay)
+    
+    def prewarm(self) -> None:
+        """Open a connection for every child engine in the background."""
+        for engine in self.engines:
+            engine.prewarm()
+    
+    def close(self) -> None:
+        """Release the pooled connections of every child engine."""
+        for engine in self.engines:
+            engine.close()
+    
+    async def aclose(self) -> None:
+        """Release the async clients of every child engine."""
+        for engine in self.engines:
+            await engine.aclose()
 
 
-def create_engine(provider: str, api_key: Optional[str] = None, model: Optional[str] = None) -> AIEngine:
+def create_engine(
+    provider: Union[str, List[str]],
+    api_key: Optional[Union[str, List[str]]] = None,
+    model: Optional[Union[str, List[str]]] = None,
+) -> AIEngine:
     """Factory function to create AI engine.
     
+    Any argument may be a list to fan requests out over several keys, models
+    or providers; single values are shared by every engine, and lists must
+    all have the same length.
+    
     Args:
         provider: Provider name (openai, anthropic, ollama)
         api_key: API key (required for openai and anthropic)
         model: Model name (optional)
         
     Returns:
-        AIEngine instance
+        AIEngine instance, or a MultiEngine when any argument is a list
     """
+    lists = [value for value in (provider, api_key, model) if isinstance(value, list)]
+    if lists:
+        count = max(len(value) for value in lists)
+        if any(len(value) != count for value in lists):
+            raise ValueError("api_provider, api_key and model lists must have the same length")
+        
+        def spread(value):
+            return value if isinstance(value, list) else [value] * count
+        
+        return MultiEngine([
+            create_engine(*args) for args in zip(spread(provider), spread(api_key), spread(model))
+        ])
+    
     if provider == "openai":
         if not api_key:
             raise ValueError("API key required for OpenAI")
@@ -1,24 +1,111 @@
 """Core writing assistant with AI-powered features."""
 
-from typing import Optional, List
+from functools import cached_property, partial
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Callable, Iterator, NamedTuple, Tuple, Union
 from pathlib import Path
 
-from .config import Config
+from .config import Config, get_config
 from .voice_profile import VoiceProfile
-from .ai_engine import create_engine, AIEngine
+from .ai_engine import create_engine, AIEngine, MultiEngine
+from .ratelimit import RATE_LIMIT_MAX_RETRIES, RateLimitedEngine, key_fingerprint, shared_rate_limiter
+from .batch import BatchItem, DEFAULT_POLL_INTERVAL, run_batch_job
+from . import tokens
+
+if TYPE_CHECKING:
+    from .cache import SemanticCache
+
+
+# Tokens reserved for chat message framing on top of the prompt text
+PROMPT_TOKEN_MARGIN = 50
+
+# Tasks accepted by WritingAssistant.stream and run_batch
+TASKS = ("continue_writing", "rewrite", "describe", "brainstorm", "dialogue", "analyze")
+
+# Tasks whose cached responses may answer similar, not just identical,
+# input; continuations, rewrites and analyses depend on the exact text
+SEMANTIC_CACHE_TASKS = ("describe", "brainstorm", "dialogue")
+
+
+class _Request(NamedTuple):
+    """A prepared generation request."""
+    
+    task: str  # Task name plus options that must match for a cache hit
+    text: str  # User-supplied text compared semantically by the cache
+    prompt: str
+    max_tokens: int
+    temperature: float
+    
+    @property
+    def semantic(self) -> bool:
+        """Whether a cached response for similar input can be reused."""
+        return self.task.split(":", 1)[0] in SEMANTIC_CACHE_TASKS
 
 
 class WritingAssistant:
     """AI-powered writing assistant for novelists."""
     
-    def __init__(self, config_dir: Optional[Path] = None, voice_profile: Optional[str] = None):
+    # Instruction templates, filled in by _build_prompt
+    _CONTINUE_TMPL = """Continue this narrative naturally, maintaining the same voice, style, and tone. 
+Write approximately {length} length continuation.
+
+Text to continue:
+{text}
+
+Continue:"""
+    
+    _REWRITE_TMPL = """Rewrite the following text{how}, maintaining the writer's voice and style.
+
+Original text:
+{text}
+
+Rewritten version:"""
+    
+    _DESCRIBE_TMPL = """Write a {detail_level} description of: {subject}
+
+Make it vivid, engaging, and suitable for a novel. Match the writer's style and voice.
+
+Description:"""
+    
+    _BRAINSTORM_TMPL = """Brainstorm {count} creative ideas for: {topic}
+
+Generate diverse, interesting ideas that could work well in the writer's style and genres.
+
+Ideas:"""
+    
+    _DIALOGUE_TMPL = """Write a {length} dialogue scene between: {char_list}
+
+Situation: {situation}
+
+Make the dialogue natural, character-driven, and match the writer's style. Include necessary action beats and description.
+
+Dialogue:"""
+    
+    _ANALYZE_TMPL = """Analyze the following text for:
+- Writing style and voice
+- Pacing and rhythm
+- Strengths and areas for improvement
+- Consistency with the writer's established voice (if applicable)
+
+Text to analyze:
+{text}
+
+Analysis:"""
+    
+    def __init__(
+        self,
+        config_dir: Optional[Path] = None,
+        voice_profile: Optional[str] = None,
+        prewarm: bool = False,
+    ):
         """Initialize writing assistant.
         
         Args:
             config_dir: Configuration directory (defaults to ~/.olivetti)
             voice_profile: Name of voice profile to use
+            prewarm: Create the engine now and start connecting to the
+                provider in the background, ahead of the first request
         """
-        self.config = Config(config_dir)
+        self.config = get_config(config_dir)
         
         # Load voice profile
         if voice_profile:
@@ -31,11 +118,42 @@ class WritingAssistant:
         else:
             self.voice_profile = None
         
-        # Initialize AI engine
-        self.engine: Optional[AIEngine] = None
-        self._init_engine()
+        # Prompt prefix for the current voice context
+        self._voice_context: Optional[str] = None
+        self._voice_prefix = ""
+        
+        if prewarm and self.engine is not None:
+            self.engine.prewarm()
+    
+    @cached_property
+    def engine(self) -> Optional[AIEngine]:
+        """AI engine, created on first generation."""
+        return self._init_engine()
+    
+    @cached_property
+    def cache(self) -> Optional["SemanticCache"]:
+        """Response cache, loaded on first generation."""
+        if not self.config.get("cache_enabled", True):
+            return None
+        
+        # Imported here so commands that never generate don't load numpy
+        from .cache import SemanticCache
+        return SemanticCache(
+            self.config.cache_dir,
+            threshold=self.config.get("cache_threshold", 0.92),
+            ttl=self.config.get("cache_ttl", 3600),
+            quantize=self.config.get("cache_quantize", False),
+        )
+    
+    @property
+    def model_name(self) -> Optional[str]:
+        """Name of the model generations are sent to."""
+        model = getattr(self.engine, "model", None) or self.config.get("model")
+        if isinstance(model, list):
+            model = model[0] if model else None
+        return model
     
-    def _init_engine(self) -> None:
+    def _init_engine(self) -> Optional[AIEngine]:
         """Initialize AI engine based on configuration."""
         provider = self.config.get("api_provider", "openai")
         api_key = self.config.get_api_key()
@@ -43,55 +161,196 @@ class WritingAssistant:
         
         if provider in ["openai", "anthropic"] and not api_key:
             # Don't raise error yet, will raise when trying to generate
-            return
+            return None
         
         try:
-            self.engine = create_engine(provider, api_key, model)
+            engine = create_engine(provider, api_key, model)
         except Exception as e:
             print(f"Warning: Failed to initialize AI engine: {e}")
+            return None
+        
+        if isinstance(engine, MultiEngine):
+            # Each key gets its own limits; the MultiEngine moves on after a 429
+            return MultiEngine([self._rate_limited(child, max_retries=0) for child in engine.engines])
+        return self._rate_limited(engine)
+    
+    def _rate_limited(self, engine: AIEngine, max_retries: int = RATE_LIMIT_MAX_RETRIES) -> AIEngine:
+        """Wrap a hosted-API engine so it respects the provider's rate limits.
+        
+        Limits come from the rate_limits config key, e.g.
+        {"openai": {"requests_per_minute": 500, "tokens_per_minute": 30000}}.
+        Without them, only 429 responses slow requests down.
+        """
+        provider = engine.provider
+        if provider not in ("openai", "anthropic"):
+            return engine
+        
+        api_key = getattr(engine, "api_key", None)
+        fingerprint = key_fingerprint(api_key)
+        limits = self.config.get("rate_limits", {}).get(provider, {})
+        learned = self.config.get("rate_limits_learned", {}).get(provider, {})
+        limiter = shared_rate_limiter(
+            provider,
+            api_key,
+            on_adjust=partial(self._save_learned_rates, self.config, provider, fingerprint),
+            requests_per_minute=limits.get("requests_per_minute"),
+            tokens_per_minute=limits.get("tokens_per_minute"),
+            rates=learned.get(fingerprint),
+        )
+        return RateLimitedEngine(engine, limiter, max_retries)
     
-    def _build_prompt(self, instruction: str, context: str = "") -> str:
+    @staticmethod
+    def _save_learned_rates(config: Config, provider: str, fingerprint: str, rates: Dict[str, float]) -> None:
+        """Persist one API key's adapted rate limits so the next run starts from them.
+        
+        Saved under rate_limits_learned[provider][fingerprint], where the
+        fingerprint is a short hash of the key.
+        """
+        learned = dict(config.get("rate_limits_learned", {}))
+        # Values that aren't dicts are rates saved per provider by older versions
+        by_key = {
+            key: value for key, value in (learned.get(provider) or {}).items() if isinstance(value, dict)
+        }
+        by_key[fingerprint] = rates
+        learned[provider] = by_key
+        config.set("rate_limits_learned", learned)
+    
+    def _build_prompt(self, template: str, context: str = "", **fields: Any) -> str:
         """Build prompt with voice profile context.
         
+        The prompt is formatted in a single pass, so long inputs are copied
+        only once.
+        
         Args:
-            instruction: The main instruction/request
+            template: Instruction template with {field} placeholders
             context: Additional context to include
+            **fields: Values for the template placeholders
             
         Returns:
             Complete prompt string
         """
-        parts = []
+        return ("{_voice_prefix}{_context}" + template).format(
+            _voice_prefix=self._get_voice_prefix(),
+            _context=f"Context:\n{context}\n\n" if context else "",
+            **fields,
+        )
+    
+    def _get_voice_prefix(self) -> str:
+        """Voice profile header for prompts, rebuilt only when the profile changes."""
+        if not self.voice_profile:
+            return ""
+        
+        voice_context = self.voice_profile.get_context_for_ai()
+        if voice_context is not self._voice_context:
+            self._voice_context = voice_context
+            self._voice_prefix = ""
+            if voice_context:
+                self._voice_prefix = f"=== Writer's Voice Profile ===\n{voice_context}\n\n=== Task ===\n"
+        return self._voice_prefix
+    
+    def _fit_input(self, text: str, template: str, max_tokens: int, keep: str) -> str:
+        """Truncate input text so the prompt and completion fit the model's context window.
         
-        # Add voice profile context if available
+        Args:
+            text: User-supplied input
+            template: Instruction template the text is inserted into
+            max_tokens: Tokens reserved for the completion
+            keep: Part of the text to keep (see tokens.truncate)
+            
+        Returns:
+            The text, shortened if necessary
+        """
+        model = self.model_name
+        overhead = tokens.count(model, self._get_voice_prefix() + template) + PROMPT_TOKEN_MARGIN
+        budget = tokens.context_limit(model) - max_tokens - overhead
+        return tokens.truncate(model, text, budget, keep)
+    
+    def _require_engine(self) -> AIEngine:
+        """Return the AI engine, or raise if it is not configured."""
+        if not self.engine:
+            raise RuntimeError("AI engine not initialized. Please configure API key.")
+        return self.engine
+    
+    def _cache_namespace(self, request: _Request) -> str:
+        """Cache namespace; only requests with the same task, model, voice and parameters share responses."""
+        provider = self.config.get("api_provider", "openai")
+        if isinstance(provider, list):
+            provider = ",".join(provider)
+        profile = ""
         if self.voice_profile:
-            voice_context = self.voice_profile.get_context_for_ai()
-            if voice_context:
-                parts.append("=== Writer's Voice Profile ===")
-                parts.append(voice_context)
-                parts.append("\n=== Task ===")
+            profile = f"{self.voice_profile.name}@{self.voice_profile.data.get('updated_at', '')}"
+        return f"{request.task}|{provider}:{self.model_name}|{profile}|{request.max_tokens}|{request.temperature}"
+    
+    def _generate(self, request: _Request) -> str:
+        """Generate a response, reusing a cached one for similar requests.
+        
+        Args:
+            request: Prepared generation request
+            
+        Returns:
+            Generated text
+        """
+        engine = self._require_engine()
         
-        # Add context if provided
-        if context:
-            parts.append(f"Context:\n{context}\n")
+        def generate() -> str:
+            return engine.generate(request.prompt, request.max_tokens, request.temperature)
         
-        # Add instruction
-        parts.append(instruction)
+        if self.cache is None:
+            return generate()
         
-        return "\n".join(parts)
+        return self.cache.get_or_compute(
+            self._cache_namespace(request),
+            request.prompt,
+            generate,
+            text=request.text,
+            semantic=request.semantic,
+        )
     
-    def continue_writing(self, text: str, length: str = "medium") -> str:
-        """Continue writing from given text.
+    def _stream(self, request: _Request) -> Iterator[str]:
+        """Stream a response, caching it once complete.
         
         Args:
-            text: The text to continue from
-            length: Length of continuation (short, medium, long)
+            request: Prepared generation request
             
-        Returns:
-            Generated continuation
+        Yields:
+            Pieces of generated text
         """
-        if not self.engine:
-            raise RuntimeError("AI engine not initialized. Please configure API key.")
+        engine = self._require_engine()
+        namespace = None
+        if self.cache is not None:
+            namespace = self._cache_namespace(request)
+            cached = self.cache.get(namespace, request.prompt, request.text, request.semantic)
+            if cached is not None:
+                yield cached
+                return
         
+        parts = []
+        for delta in engine.stream(request.prompt, request.max_tokens, request.temperature):
+            parts.append(delta)
+            yield delta
+        
+        response = "".join(parts)
+        if namespace is not None and response:
+            self.cache.put(namespace, request.prompt, response, request.text)
+    
+    async def _agenerate(self, request: _Request) -> str:
+        """Async version of `_generate`."""
+        engine = self._require_engine()
+        if self.cache is None:
+            return await engine.agenerate(request.prompt, request.max_tokens, request.temperature)
+        
+        namespace = self._cache_namespace(request)
+        cached = self.cache.get(namespace, request.prompt, request.text, request.semantic)
+        if cached is not None:
+            return cached
+        
+        response = await engine.agenerate(request.prompt, request.max_tokens, request.temperature)
+        if response:
+            self.cache.put(namespace, request.prompt, response, request.text)
+        return response
+    
+    def _continue_request(self, text: str, length: str = "medium") -> _Request:
+        """Prepare a continue_writing request."""
         length_tokens = {
             "short": 200,
             "medium": 500,
@@ -100,18 +359,79 @@ class WritingAssistant:
         
         max_tokens = length_tokens.get(length, 500)
         
-        instruction = f"""Continue this narrative naturally, maintaining the same voice, style, and tone. 
-Write approximately {length} length continuation.
-
-Text to continue:
-{text}
-
-Continue:"""
+        # The end of the text matters most for a continuation
+        text = self._fit_input(text, self._CONTINUE_TMPL, max_tokens, keep="tail")
+        prompt = self._build_prompt(self._CONTINUE_TMPL, text=text, length=length)
         
-        prompt = self._build_prompt(instruction)
+        temperature = self.config.get("temperature", 0.8)
+        return _Request("continue", text, prompt, max_tokens, temperature)
+    
+    def _rewrite_request(self, text: str, instruction: str = "") -> _Request:
+        """Prepare a rewrite request."""
+        temperature = self.config.get("temperature", 0.8)
+        max_tokens = self.config.get("max_tokens", 2000)
+        
+        how = f" to be {instruction}" if instruction else ""
+        text = self._fit_input(text, self._REWRITE_TMPL, max_tokens, keep="head")
+        prompt = self._build_prompt(self._REWRITE_TMPL, text=text, how=how)
+        return _Request(f"rewrite:{instruction}", text, prompt, max_tokens, temperature)
+    
+    def _describe_request(self, subject: str, detail_level: str = "detailed") -> _Request:
+        """Prepare a describe request."""
+        prompt = self._build_prompt(self._DESCRIBE_TMPL, subject=subject, detail_level=detail_level)
         
         temperature = self.config.get("temperature", 0.8)
-        return self.engine.generate(prompt, max_tokens, temperature)
+        max_tokens = self.config.get("max_tokens", 2000)
+        return _Request(f"describe:{detail_level}", subject, prompt, max_tokens, temperature)
+    
+    def _brainstorm_request(self, topic: str, count: int = 5) -> _Request:
+        """Prepare a brainstorm request."""
+        prompt = self._build_prompt(self._BRAINSTORM_TMPL, topic=topic, count=count)
+        
+        temperature = self.config.get("temperature", 0.9)  # Higher for creativity
+        max_tokens = self.config.get("max_tokens", 2000)
+        return _Request(f"brainstorm:{count}", topic, prompt, max_tokens, temperature)
+    
+    def _dialogue_request(self, characters: List[str], situation: str, length: str = "medium") -> _Request:
+        """Prepare a dialogue request."""
+        length_tokens = {
+            "short": 300,
+            "medium": 600,
+            "long": 1200,
+        }
+        
+        max_tokens = length_tokens.get(length, 600)
+        
+        char_list = ", ".join(characters)
+        
+        prompt = self._build_prompt(
+            self._DIALOGUE_TMPL, char_list=char_list, situation=situation, length=length
+        )
+        
+        temperature = self.config.get("temperature", 0.85)
+        return _Request(f"dialogue:{char_list}", situation, prompt, max_tokens, temperature)
+    
+    def _analyze_request(self, text: str) -> _Request:
+        """Prepare an analyze request."""
+        temperature = 0.5  # Lower for analytical tasks
+        max_tokens = self.config.get("max_tokens", 2000)
+        
+        # Keep the opening and the ending when the middle has to go
+        text = self._fit_input(text, self._ANALYZE_TMPL, max_tokens, keep="head_tail")
+        prompt = self._build_prompt(self._ANALYZE_TMPL, text=text)
+        return _Request("analyze", text, prompt, max_tokens, temperature)
+    
+    def continue_writing(self, text: str, length: str = "medium") -> str:
+        """Continue writing from given text.
+        
+        Args:
+            text: The text to continue from
+            length: Length of continuation (short, medium, long)
+            
+        Returns:
+            Generated continuation
+        """
+        return self._generate(self._continue_request(text, length))
     
     def rewrite(self, text: str, instruction: str = "") -> str:
         """Rewrite text with optional instruction.
@@ -123,26 +443,7 @@ Continue:"""
         Returns:
             Rewritten text
         """
-        if not self.engine:
-            raise RuntimeError("AI engine not initialized. Please configure API key.")
-        
-        base_instruction = "Rewrite the following text"
-        if instruction:
-            base_instruction += f" to be {instruction}"
-        base_instruction += ", maintaining the writer's voice and style."
-        
-        full_instruction = f"""{base_instruction}
-
-Original text:
-{text}
-
-Rewritten version:"""
-        
-        prompt = self._build_prompt(full_instruction)
-        
-        temperature = self.config.get("temperature", 0.8)
-        max_tokens = self.config.get("max_tokens", 2000)
-        return self.engine.generate(prompt, max_tokens, temperature)
+        return self._generate(self._rewrite_request(text, instruction))
     
     def describe(self, subject: str, detail_level: str = "detailed") -> str:
         """Generate description of a subject.
@@ -154,20 +455,7 @@ Rewritten version:"""
         Returns:
             Generated description
         """
-        if not self.engine:
-            raise RuntimeError("AI engine not initialized. Please configure API key.")
-        
-        instruction = f"""Write a {detail_level} description of: {subject}
-
-Make it vivid, engaging, and suitable for a novel. Match the writer's style and voice.
-
-Description:"""
-        
-        prompt = self._build_prompt(instruction)
-        
-        temperature = self.config.get("temperature", 0.8)
-        max_tokens = self.config.get("max_tokens", 2000)
-        return self.engine.generate(prompt, max_tokens, temperature)
+        return self._generate(self._describe_request(subject, detail_level))
     
     def brainstorm(self, topic: str, count: int = 5) -> str:
         """Generate ideas about a topic.
@@ -179,20 +467,7 @@ Description:"""
         Returns:
             Generated ideas
         """
-        if not self.engine:
-            raise RuntimeError("AI engine not initialized. Please configure API key.")
-        
-        instruction = f"""Brainstorm {count} creative ideas for: {topic}
-
-Generate diverse, interesting ideas that could work well in the writer's style and genres.
-
-Ideas:"""
-        
-        prompt = self._build_prompt(instruction)
-        
-        temperature = self.config.get("temperature", 0.9)  # Higher for creativity
-        max_tokens = self.config.get("max_tokens", 2000)
-        return self.engine.generate(prompt, max_tokens, temperature)
+        return self._generate(self._brainstorm_request(topic, count))
     
     def dialogue(self, characters: List[str], situation: str, length: str = "medium") -> str:
         """Generate dialogue between characters.
@@ -205,31 +480,7 @@ Ideas:"""
         Returns:
             Generated dialogue
         """
-        if not self.engine:
-            raise RuntimeError("AI engine not initialized. Please configure API key.")
-        
-        length_tokens = {
-            "short": 300,
-            "medium": 600,
-            "long": 1200,
-        }
-        
-        max_tokens = length_tokens.get(length, 600)
-        
-        char_list = ", ".join(characters)
-        
-        instruction = f"""Write a {length} dialogue scene between: {char_list}
-
-Situation: {situation}
-
-Make the dialogue natural, character-driven, and match the writer's style. Include necessary action beats and description.
-
-Dialogue:"""
-        
-        prompt = self._build_prompt(instruction)
-        
-        temperature = self.config.get("temperature", 0.85)
-        return self.engine.generate(prompt, max_tokens, temperature)
+        return self._generate(self._dialogue_request(characters, situation, length))
     
     def analyze(self, text: str) -> str:
         """Analyze text for style, pacing, and other elements.
@@ -240,22 +491,177 @@ Dialogue:"""
         Returns:
             Analysis results
         """
-        if not self.engine:
-            raise RuntimeError("AI engine not initialized. Please configure API key.")
+        return self._generate(self._analyze_request(text))
+    
+    def stream(self, task: str, **kwargs: Any) -> Iterator[str]:
+        """Run a generation task, yielding text as it arrives.
         
-        instruction = f"""Analyze the following text for:
-- Writing style and voice
-- Pacing and rhythm
-- Strengths and areas for improvement
-- Consistency with the writer's established voice (if applicable)
-
-Text to analyze:
-{text}
-
-Analysis:"""
+        Args:
+            task: One of continue_writing, rewrite, describe, brainstorm,
+                dialogue or analyze
+            **kwargs: Arguments for the task method
+            
+        Yields:
+            Pieces of generated text
+        """
+        return self._stream(self._request(task, kwargs))
+    
+    def _request(self, task: str, kwargs: Dict[str, Any]) -> _Request:
+        """Prepare a request for a task by name."""
+        builders = {
+            "continue_writing": self._continue_request,
+            "rewrite": self._rewrite_request,
+            "describe": self._describe_request,
+            "brainstorm": self._brainstorm_request,
+            "dialogue": self._dialogue_request,
+            "analyze": self._analyze_request,
+        }
+        if task not in builders:
+            raise ValueError(f"Unknown task: {task}. Supported: {', '.join(TASKS)}")
         
-        prompt = self._build_prompt(instruction)
+        return builders[task](**kwargs)
+    
+    async def acontinue_writing(self, text: str, length: str = "medium") -> str:
+        """Async version of `continue_writing`."""
+        return await self._agenerate(self._continue_request(text, length))
+    
+    async def arewrite(self, text: str, instruction: str = "") -> str:
+        """Async version of `rewrite`."""
+        return await self._agenerate(self._rewrite_request(text, instruction))
+    
+    async def adescribe(self, subject: str, detail_level: str = "detailed") -> str:
+        """Async version of `describe`."""
+        return await self._agenerate(self._describe_request(subject, detail_level))
+    
+    async def abrainstorm(self, topic: str, count: int = 5) -> str:
+        """Async version of `brainstorm`."""
+        return await self._agenerate(self._brainstorm_request(topic, count))
+    
+    async def adialogue(self, characters: List[str], situation: str, length: str = "medium") -> str:
+        """Async version of `dialogue`."""
+        return await self._agenerate(self._dialogue_request(characters, situation, length))
+    
+    async def aanalyze(self, text: str) -> str:
+        """Async version of `analyze`."""
+        return await self._agenerate(self._analyze_request(text))
+    
+    async def abatch(
+        self,
+        requests: List[Tuple[str, Dict[str, Any]]],
+        max_concurrency: int = 10,
+        requests_per_minute: Optional[float] = None,
+    ) -> List[Union[str, Exception]]:
+        """Run several generation tasks concurrently.
         
-        temperature = 0.5  # Lower for analytical tasks
-        max_tokens = self.config.get("max_tokens", 2000)
-        return self.engine.generate(prompt, max_tokens, temperature)
+        Args:
+            requests: (task, kwargs) pairs, where task is one of continue_writing,
+                rewrite, describe, brainstorm, dialogue or analyze
+            max_concurrency: Maximum requests in flight at once
+            requests_per_minute: Optional rate limit (requires aiolimiter)
+            
+        Returns:
+            Results in request order; a failed request's exception takes its place
+        """
+        methods = {task: getattr(self, f"a{task}") for task in TASKS}
+        for task, _ in requests:
+            if task not in methods:
+                raise ValueError(f"Unknown task: {task}. Supported: {', '.join(TASKS)}")
+        
+        limiter = None
+        if requests_per_minute:
+            try:
+                from aiolimiter import AsyncLimiter
+            except ImportError:
+                raise ImportError(
+                    "aiolimiter package not installed. Install with: pip install aiolimiter"
+                )
+            limiter = AsyncLimiter(requests_per_minute, 60)
+        
+        # asyncio is imported on demand to keep CLI startup fast
+        import asyncio
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run(task: str, kwargs: Dict[str, Any]) -> str:
+            async with semaphore:
+                if limiter is not None:
+                    async with limiter:
+                        return await methods[task](**kwargs)
+                return await methods[task](**kwargs)
+        
+        try:
+            return await asyncio.gather(
+                *(run(task, kwargs) for task, kwargs in requests),
+                return_exceptions=True,
+            )
+        finally:
+            if self.engine:
+                await self.engine.aclose()
+    
+    def run_batch(
+        self,
+        requests: List[Tuple[str, Dict[str, Any]]],
+        max_concurrency: int = 10,
+        requests_per_minute: Optional[float] = None,
+    ) -> List[Union[str, Exception]]:
+        """Run several generation tasks concurrently from synchronous code.
+        
+        See `abatch` for arguments.
+        """
+        import asyncio
+        return asyncio.run(self.abatch(requests, max_concurrency, requests_per_minute))
+    
+    def run_batch_job(
+        self,
+        task: str,
+        inputs: List[Dict[str, Any]],
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        on_submit: Optional[Callable[[str], None]] = None,
+    ) -> List[Optional[str]]:
+        """Run one task over many inputs as a provider Batch API job.
+        
+        Batch jobs cost about half as much as interactive calls but may take
+        up to 24 hours, so this suits bulk work that nobody is waiting on.
+        Inputs with a cached response are not submitted.
+        
+        Args:
+            task: One of continue_writing, rewrite, describe, brainstorm,
+                dialogue or analyze
+            inputs: Keyword arguments for the task method, one dict per request
+            poll_interval: Seconds between batch status checks
+            on_submit: Called with the batch ID once submitted
+            
+        Returns:
+            Results in input order; None where a request failed
+        """
+        engine = self._require_engine()
+        requests = [self._request(task, kwargs) for kwargs in inputs]
+        results: List[Optional[str]] = [None] * len(requests)
+        
+        pending = []
+        for i, request in enumerate(requests):
+            cached = None
+            if self.cache is not None:
+                cached = self.cache.get(
+                    self._cache_namespace(request), request.prompt, request.text, request.semantic
+                )
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+        
+        if not pending:
+            return results
+        
+        items = [
+            BatchItem(f"request-{i}", requests[i].prompt, requests[i].max_tokens, requests[i].temperature)
+            for i in pending
+        ]
+        responses = run_batch_job(engine, items, poll_interval, on_submit)
+        
+        for i in pending:
+            response = responses.get(f"request-{i}")
+            results[i] = response
+            if response and self.cache is not None:
+                self.cache.put(self._cache_namespace(requests[i]), requests[i].prompt, response, requests[i].text)
+        
+        return results
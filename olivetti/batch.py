@@ -0,0 +1,182 @@
+"""Provider Batch API support for bulk, non-interactive generation."""
+
+import json
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from .ai_engine import AIEngine, OpenAIEngine, AnthropicEngine, MultiEngine
+from .ratelimit import RateLimitedEngine
+
+
+# Default seconds between batch status checks
+DEFAULT_POLL_INTERVAL = 30
+
+
+class BatchItem(NamedTuple):
+    """One prompt in a batch job."""
+
+    custom_id: str  # Letters, digits, "_" and "-" only (Anthropic requirement)
+    prompt: str
+    max_tokens: int
+    temperature: float
+
+
+def _batch_engine(engine: AIEngine) -> AIEngine:
+    """Get the engine that owns batch jobs.
+
+    Batch IDs belong to one API key, so a MultiEngine always submits and
+    polls through its first child. Batch requests don't count against the
+    interactive rate limits, so rate-limit wrappers are skipped.
+    """
+    if isinstance(engine, MultiEngine):
+        engine = engine.engines[0]
+    if isinstance(engine, RateLimitedEngine):
+        engine = engine.engine
+    return engine
+
+
+def submit_batch(engine: AIEngine, items: List[BatchItem]) -> str:
+    """Submit prompts as a provider batch job.
+
+    Args:
+        engine: OpenAIEngine or AnthropicEngine
+        items: Prompts to generate
+
+    Returns:
+        Provider batch ID
+    """
+    engine = _batch_engine(engine)
+
+    if isinstance(engine, OpenAIEngine):
+        lines = [
+            json.dumps({
+                "custom_id": item.custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": engine.model,
+                    "messages": [{"role": "user", "content": item.prompt}],
+                    "max_tokens": item.max_tokens,
+                    "temperature": item.temperature,
+                },
+            })
+            for item in items
+        ]
+        batch_file = engine.client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch",
+        )
+        batch = engine.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return batch.id
+
+    if isinstance(engine, AnthropicEngine):
+        batch = engine.client.messages.batches.create(
+            requests=[
+                {
+                    "custom_id": item.custom_id,
+                    "params": {
+                        "model": engine.model,
+                        "max_tokens": item.max_tokens,
+                        "temperature": item.temperature,
+                        "messages": [{"role": "user", "content": item.prompt}],
+                    },
+                }
+                for item in items
+            ]
+        )
+        return batch.id
+
+    raise ValueError(f"Batch API not supported for {type(engine).__name__}")
+
+
+def batch_status(engine: AIEngine, batch_id: str) -> str:
+    """Get the status of a batch job.
+
+    Returns:
+        "in_progress", "completed" or the provider's failure status
+    """
+    engine = _batch_engine(engine)
+
+    if isinstance(engine, OpenAIEngine):
+        status = engine.client.batches.retrieve(batch_id).status
+        if status in ("validating", "in_progress", "finalizing", "cancelling"):
+            return "in_progress"
+        return status
+
+    if isinstance(engine, AnthropicEngine):
+        status = engine.client.messages.batches.retrieve(batch_id).processing_status
+        # Canceled batches also end; their finished requests still have results
+        return "completed" if status == "ended" else "in_progress"
+
+    raise ValueError(f"Batch API not supported for {type(engine).__name__}")
+
+
+def batch_results(engine: AIEngine, batch_id: str) -> Dict[str, str]:
+    """Download the results of a completed batch job.
+
+    Returns:
+        Generated text by custom_id; failed requests are omitted
+    """
+    engine = _batch_engine(engine)
+
+    results = {}
+
+    if isinstance(engine, OpenAIEngine):
+        batch = engine.client.batches.retrieve(batch_id)
+        if not batch.output_file_id:
+            return results
+
+        content = engine.client.files.content(batch.output_file_id).text
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") == 200:
+                results[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return results
+
+    if isinstance(engine, AnthropicEngine):
+        for record in engine.client.messages.batches.results(batch_id):
+            if record.result.type == "succeeded":
+                results[record.custom_id] = record.result.message.content[0].text
+        return results
+
+    raise ValueError(f"Batch API not supported for {type(engine).__name__}")
+
+
+def run_batch_job(
+    engine: AIEngine,
+    items: List[BatchItem],
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    on_submit: Optional[Callable[[str], None]] = None,
+) -> Dict[str, str]:
+    """Submit a batch job and wait for its results.
+
+    Args:
+        engine: OpenAIEngine or AnthropicEngine
+        items: Prompts to generate
+        poll_interval: Seconds between status checks
+        on_submit: Called with the batch ID once submitted
+
+    Returns:
+        Generated text by custom_id; failed requests are omitted
+    """
+    batch_id = submit_batch(engine, items)
+    if on_submit:
+        on_submit(batch_id)
+
+    while True:
+        status = batch_status(engine, batch_id)
+        if status != "in_progress":
+            break
+        time.sleep(poll_interval)
+
+    if status != "completed":
+        raise RuntimeError(f"Batch {batch_id} did not complete: {status}")
+
+    return batch_results(engine, batch_id)
@@ -0,0 +1,582 @@
+"""Semantic response cache for AI generations."""
+
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+import numpy as np
+
+from .embeddings import DEFAULT_EMBEDDING_MODEL, get_embedder
+
+try:
+    import hnswlib
+except ImportError:  # Optional; lookups fall back to a full matmul scan
+    hnswlib = None
+
+
+def quantize_embeddings(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantize embedding rows to int8 with one scale per row.
+
+    Args:
+        vectors: float32 array of shape (n, dim)
+
+    Returns:
+        (codes, scales), where vectors ~= codes * scales[:, None]
+    """
+    if not len(vectors):
+        return vectors.astype(np.int8), np.empty(0, dtype=np.float32)
+
+    scales = (np.abs(vectors).max(axis=1) / 127).astype(np.float32)
+    divisors = np.where(scales > 0, scales, 1)
+    codes = np.round(vectors / divisors[:, None]).astype(np.int8)
+    return codes, scales
+
+
+class SemanticCache:
+    """Cache AI responses and reuse them for identical or near-identical requests.
+
+    Entries are grouped by namespace (task, voice profile and generation
+    parameters), so a hit is only ever returned for the same kind of request.
+    Within a namespace, an exact prompt match is found by digest; otherwise the
+    request text is embedded and its nearest stored neighbour is looked up in
+    an HNSW index (when hnswlib is installed) or with one matrix-vector product.
+
+    Entries live in a single SQLite database in WAL mode, with embeddings
+    stored as float32 blobs, so each change is one small transaction. All
+    embeddings are kept in memory as one contiguous matrix.
+    """
+
+    DB_FILE = "cache.sqlite"
+    INDEX_FILE = "hnsw.bin"
+
+    # Files written by earlier versions, removed on load
+    LEGACY_FILES = ("entries.json", "embeddings.npy")
+
+    # The HNSW index is saved after this many additions; entries added since
+    # the last save are inserted into the loaded index on startup
+    INDEX_SAVE_INTERVAL = 100
+
+    # Rows of int8 embeddings dequantized at a time during a brute-force scan
+    SCAN_BLOCK_ROWS = 4096
+
+    # HNSW graph parameters
+    HNSW_M = 16
+    HNSW_EF_CONSTRUCTION = 200
+    HNSW_EF_SEARCH = 64
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        threshold: float = 0.92,
+        ttl: float = 3600,
+        max_entries: int = 1000,
+        embedding_model: Optional[str] = DEFAULT_EMBEDDING_MODEL,
+        quantize: bool = False,
+        semantic: Optional[bool] = None,
+    ):
+        """Initialize semantic cache.
+
+        Args:
+            cache_dir: Directory to store cache files
+            threshold: Minimum cosine similarity for a semantic hit
+            ttl: Seconds an entry stays valid
+            max_entries: Maximum entries kept; the oldest are evicted first
+            embedding_model: sentence-transformers model name, or None to use
+                hash embeddings
+            quantize: Store embeddings as int8 with a per-row scale, using a
+                quarter of the memory and disk space of float32
+            semantic: Whether similar texts can hit, not just identical
+                prompts. Defaults to on only with a sentence-transformers
+                model, since hash embeddings ignore word order.
+        """
+        self.cache_dir = cache_dir
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embedding_model = embedding_model
+        self.quantize = quantize
+
+        self._embedder = get_embedder(embedding_model)
+        if semantic is None:
+            semantic = not self.embedder_name.startswith("hash:")
+        self.semantic = semantic
+        self._entries: List[Dict[str, Any]] = []
+        self._namespace_codes: Dict[str, int] = {}
+        self._set_embeddings(np.empty((0, 0), dtype=np.float32))
+        self._by_key: Dict[str, Dict[str, Any]] = {}
+        self._by_label: Dict[int, Dict[str, Any]] = {}
+        self._index = None
+        self._unsaved_index_items = 0
+        self._embedder_stored = False
+        self._conn = self._connect()
+        self._load()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the cache database, creating its tables if needed."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.cache_dir / self.DB_FILE), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with conn:
+            # AUTOINCREMENT keeps labels unique even after the newest entries
+            # are deleted, so they never collide with nodes in a saved index
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "label INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "key TEXT NOT NULL, "
+                "namespace TEXT NOT NULL, "
+                "text TEXT NOT NULL, "
+                "response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "hits INTEGER NOT NULL DEFAULT 0, "
+                "embedding BLOB NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        return conn
+
+    @property
+    def embedder_name(self) -> str:
+        """Identifier of the embedding function in use."""
+        return self._embedder.name
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as L2-normalized float32 rows.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Array of shape (len(texts), dim)
+        """
+        return self._embedder.embed(texts)
+
+    @staticmethod
+    def _digest(namespace: str, prompt: str) -> str:
+        """Exact-match key for a prompt within a namespace."""
+        digest = hashlib.sha256(namespace.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(
+        self,
+        namespace: str,
+        prompt: str,
+        text: Optional[str] = None,
+        semantic: bool = True,
+    ) -> Optional[str]:
+        """Look up a cached response.
+
+        Args:
+            namespace: Request kind; hits never cross namespaces
+            prompt: Full prompt sent to the engine, used for exact matches
+            text: Variable part of the request to compare semantically
+                (defaults to the prompt)
+            semantic: Whether a similar text may hit; False for requests
+                whose answer depends on the exact text
+
+        Returns:
+            Cached response, or None on a miss
+        """
+        self._expire()
+        if not self._entries:
+            return None
+
+        entry = self._by_key.get(self._digest(namespace, prompt))
+        if entry is None:
+            if not (semantic and self.semantic):
+                return None
+            query = self.embed([text if text is not None else prompt])[0]
+            if self._index is not None:
+                entry, similarity = self._query_index(namespace, query)
+            else:
+                entry, similarity = self._query_matrix(namespace, query)
+            if entry is None or similarity < self.threshold:
+                return None
+
+        with self._conn:
+            self._conn.execute("UPDATE entries SET hits = hits + 1 WHERE label = ?", (entry["label"],))
+        return entry["response"]
+
+    def _query_index(self, namespace: str, query: np.ndarray):
+        """Find the nearest entry in the namespace using the HNSW index."""
+        def in_namespace(label: int) -> bool:
+            entry = self._by_label.get(label)
+            return entry is not None and entry["namespace"] == namespace
+
+        try:
+            labels, distances = self._index.knn_query(query, k=1, num_threads=1, filter=in_namespace)
+        except RuntimeError:
+            # No entries in this namespace
+            return None, 0.0
+        return self._by_label[int(labels[0][0])], 1.0 - float(distances[0][0])
+
+    def _query_matrix(self, namespace: str, query: np.ndarray):
+        """Find the nearest entry in the namespace with a full matmul scan."""
+        code = self._namespace_codes.get(namespace)
+        candidates = np.flatnonzero(self._row_namespaces == code) if code is not None else []
+        if not len(candidates):
+            return None, 0.0
+
+        # One matrix-vector product over every row beats gathering the candidates first
+        similarities = self._similarities(query)[candidates]
+        best = int(np.argmax(similarities))
+        return self._entries[candidates[best]], float(similarities[best])
+
+    def put(self, namespace: str, prompt: str, response: str, text: Optional[str] = None) -> None:
+        """Store a response.
+
+        Args:
+            namespace: Request kind
+            prompt: Full prompt sent to the engine
+            response: Generated response
+            text: Variable part of the request to compare semantically
+                (defaults to the prompt)
+        """
+        text = text if text is not None else prompt
+        vector = self.embed([text])
+        rows, scales = self._encode(vector)
+
+        entry = {
+            "key": self._digest(namespace, prompt),
+            "namespace": namespace,
+            "text": text,
+            "response": response,
+            "created_at": time.time(),
+        }
+
+        with self._conn:
+            if not self._embedder_stored:
+                self._store_embedder()
+            # Evict the oldest entries to make room
+            self._evict(len(self._entries) + 1 - self.max_entries)
+            cursor = self._conn.execute(
+                "INSERT INTO entries (key, namespace, text, response, created_at, embedding) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (entry["key"], namespace, text, response, entry["created_at"], self._blob(rows, scales, 0)),
+            )
+        entry["label"] = cursor.lastrowid
+        self._add_entry(entry)
+
+        if self._buffer.shape[1] != vector.shape[1]:
+            self._set_embeddings(np.empty((0, vector.shape[1]), dtype=np.float32))
+            self._index = None
+        self._append_row(rows, scales, namespace)
+
+        if self._index is None or self._index.get_current_count() >= self._index.get_max_elements():
+            # Rebuilding also compacts away evicted entries
+            self._build_index()
+        else:
+            self._index.add_items(vector, [entry["label"]])
+            self._unsaved_index_items += 1
+            if self._unsaved_index_items >= self.INDEX_SAVE_INTERVAL:
+                self._save_index()
+
+    def get_or_compute(
+        self,
+        namespace: str,
+        prompt: str,
+        compute: Callable[[], str],
+        text: Optional[str] = None,
+        semantic: bool = True,
+    ) -> str:
+        """Return a cached response, or compute, cache and return a new one.
+
+        Args:
+            namespace: Request kind
+            prompt: Full prompt sent to the engine
+            compute: Produces the response on a miss
+            text: Variable part of the request to compare semantically
+            semantic: Whether a similar text may hit (see `get`)
+
+        Returns:
+            Response text
+        """
+        cached = self.get(namespace, prompt, text, semantic)
+        if cached is not None:
+            return cached
+
+        response = compute()
+        if response:
+            self.put(namespace, prompt, response, text)
+        return response
+
+    def clear(self) -> None:
+        """Remove all cached entries."""
+        self._entries = []
+        self._set_embeddings(np.empty((0, 0), dtype=np.float32))
+        self._by_key = {}
+        self._by_label = {}
+        self._index = None
+        with self._conn:
+            self._conn.execute("DELETE FROM entries")
+        self._save_index()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def _embeddings(self) -> np.ndarray:
+        """float32 embeddings of the live entries, in entry order."""
+        rows = self._buffer[self._start:self._start + self._size]
+        if self._scale_buffer is None:
+            return rows
+        return rows.astype(np.float32) * self._scale_buffer[self._start:self._start + self._size, None]
+
+    @property
+    def _row_namespaces(self) -> np.ndarray:
+        """Namespace code of each live entry, aligned with `_embeddings`."""
+        return self._namespace_buffer[self._start:self._start + self._size]
+
+    def _namespace_code(self, namespace: str) -> int:
+        """Small integer standing in for a namespace in `_row_namespaces`."""
+        return self._namespace_codes.setdefault(namespace, len(self._namespace_codes))
+
+    def _similarities(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the query to every live entry."""
+        rows = self._buffer[self._start:self._start + self._size]
+        if self._scale_buffer is None:
+            return rows @ query
+
+        # The query stays float32; int8 rows are widened a block at a time
+        similarities = np.empty(self._size, dtype=np.float32)
+        for start in range(0, self._size, self.SCAN_BLOCK_ROWS):
+            block = rows[start:start + self.SCAN_BLOCK_ROWS]
+            similarities[start:start + len(block)] = block.astype(np.float32) @ query
+        return similarities * self._scale_buffer[self._start:self._start + self._size]
+
+    def _encode(self, embeddings: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Convert float32 embeddings to stored rows and per-row scales."""
+        if self.quantize:
+            return quantize_embeddings(embeddings)
+        return np.ascontiguousarray(embeddings, dtype=np.float32), None
+
+    @staticmethod
+    def _blob(rows: np.ndarray, scales: Optional[np.ndarray], i: int) -> bytes:
+        """Serialize one stored row; int8 rows are prefixed with their scale."""
+        if scales is None:
+            return rows[i].tobytes()
+        return scales[i:i + 1].tobytes() + rows[i].tobytes()
+
+    def _set_embeddings(self, embeddings: np.ndarray) -> None:
+        """Replace all embeddings with one float32 row per entry."""
+        self._set_rows(*self._encode(embeddings))
+
+    def _set_rows(self, rows: np.ndarray, scales: Optional[np.ndarray]) -> None:
+        """Replace all stored rows with one per entry."""
+        self._buffer = rows
+        self._scale_buffer = scales
+        self._namespace_buffer = np.fromiter(
+            (self._namespace_code(entry["namespace"]) for entry in self._entries),
+            dtype=np.int32,
+            count=len(self._entries),
+        )
+        self._start = 0
+        self._size = len(self._buffer)
+
+    def _append_row(self, rows: np.ndarray, scales: Optional[np.ndarray], namespace: str) -> None:
+        """Append one stored row, growing the buffers geometrically."""
+        end = self._start + self._size
+        if end == len(self._buffer):
+            # Full: move the live rows to the front of buffers twice their size
+            capacity = max(2 * self._size, 16)
+            live = slice(self._start, end)
+            buffer = np.empty((capacity, self._buffer.shape[1]), dtype=self._buffer.dtype)
+            buffer[:self._size] = self._buffer[live]
+            namespace_buffer = np.empty(capacity, dtype=np.int32)
+            namespace_buffer[:self._size] = self._namespace_buffer[live]
+            if self._scale_buffer is not None:
+                scale_buffer = np.empty(capacity, dtype=np.float32)
+                scale_buffer[:self._size] = self._scale_buffer[live]
+                self._scale_buffer = scale_buffer
+            self._buffer, self._namespace_buffer = buffer, namespace_buffer
+            self._start, end = 0, self._size
+
+        self._buffer[end] = rows[0]
+        if self._scale_buffer is not None:
+            self._scale_buffer[end] = scales[0]
+        self._namespace_buffer[end] = self._namespace_code(namespace)
+        self._size += 1
+
+    def _add_entry(self, entry: Dict[str, Any]) -> None:
+        """Append an entry and register it in the lookup tables."""
+        self._entries.append(entry)
+        self._by_key[entry["key"]] = entry
+        self._by_label[entry["label"]] = entry
+
+    def _evict(self, count: int) -> None:
+        """Drop the oldest `count` entries."""
+        if count <= 0:
+            return
+
+        # Labels increase with insertion order, so the oldest entries are a range
+        self._conn.execute("DELETE FROM entries WHERE label <= ?", (self._entries[count - 1]["label"],))
+        for entry in self._entries[:count]:
+            if self._by_key.get(entry["key"]) is entry:
+                del self._by_key[entry["key"]]
+            del self._by_label[entry["label"]]
+            if self._index is not None:
+                # Deleted nodes stay in the graph for traversal until the next rebuild
+                self._index.mark_deleted(entry["label"])
+
+        del self._entries[:count]
+        # Evicted rows are dropped from the front without copying
+        self._start += count
+        self._size -= count
+
+    def _expire(self) -> None:
+        """Drop entries older than the TTL."""
+        if not self._entries:
+            return
+        cutoff = time.time() - self.ttl
+        if self._entries[0]["created_at"] >= cutoff:
+            return
+
+        # Entries are in insertion order, so expired ones form a prefix
+        count = next(
+            (i for i, entry in enumerate(self._entries) if entry["created_at"] >= cutoff),
+            len(self._entries),
+        )
+        with self._conn:
+            self._evict(count)
+
+    def _index_capacity(self) -> int:
+        """Index size; the headroom holds evicted nodes between rebuilds."""
+        return 2 * max(self.max_entries, len(self._entries))
+
+    def _new_index(self, dim: int):
+        """Create an empty HNSW index, or None if hnswlib is unavailable."""
+        if hnswlib is None:
+            return None
+
+        index = hnswlib.Index(space="cosine", dim=dim)
+        index.init_index(
+            max_elements=self._index_capacity(),
+            M=self.HNSW_M,
+            ef_construction=self.HNSW_EF_CONSTRUCTION,
+        )
+        index.set_ef(self.HNSW_EF_SEARCH)
+        return index
+
+    def _build_index(self) -> None:
+        """Build the HNSW index from the stored embeddings."""
+        self._index = None
+        if not self._entries:
+            return
+
+        index = self._new_index(self._buffer.shape[1])
+        if index is not None:
+            index.add_items(self._embeddings, [entry["label"] for entry in self._entries])
+        self._index = index
+        self._save_index()
+
+    def _load_index(self, index_file: Path) -> bool:
+        """Load the saved HNSW index and bring it up to date with the entries."""
+        if hnswlib is None or not self._entries:
+            return False
+
+        try:
+            index = hnswlib.Index(space="cosine", dim=self._buffer.shape[1])
+            index.load_index(str(index_file), max_elements=self._index_capacity())
+        except (OSError, RuntimeError):
+            return False
+
+        saved = set(index.get_ids_list())
+        missing = [i for i, entry in enumerate(self._entries) if entry["label"] not in saved]
+        if index.get_current_count() + len(missing) > index.get_max_elements():
+            return False
+        if missing:
+            index.add_items(self._embeddings[missing], [self._entries[i]["label"] for i in missing])
+
+        # Entries deleted since the index was saved
+        for label in saved - self._by_label.keys():
+            try:
+                index.mark_deleted(label)
+            except RuntimeError:
+                # Already marked deleted
+                pass
+
+        index.set_ef(self.HNSW_EF_SEARCH)
+        self._index = index
+        self._unsaved_index_items = len(missing)
+        return True
+
+    def _load(self) -> None:
+        """Load cached entries, re-embedding them if the embedder changed."""
+        for name in self.LEGACY_FILES:
+            legacy_file = self.cache_dir / name
+            if legacy_file.exists():
+                legacy_file.unlink()
+
+        rows = self._conn.execute(
+            "SELECT label, key, namespace, text, response, created_at, embedding "
+            "FROM entries ORDER BY label"
+        ).fetchall()
+        if not rows:
+            return
+
+        blobs = []
+        for label, key, namespace, text, response, created_at, embedding in rows:
+            self._add_entry({
+                "key": key,
+                "label": label,
+                "namespace": namespace,
+                "text": text,
+                "response": response,
+                "created_at": created_at,
+            })
+            blobs.append(embedding)
+
+        embedder = self._conn.execute("SELECT value FROM meta WHERE name = 'embedder'").fetchone()
+        reuse = embedder is not None and embedder[0] == self._storage_name
+        self._embedder_stored = reuse
+        if reuse:
+            # One contiguous matrix from all rows at once
+            data = np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(len(rows), -1)
+            if self.quantize:
+                self._set_rows(data[:, 4:].view(np.int8).copy(), data[:, :4].copy().view(np.float32).ravel())
+            else:
+                self._set_rows(data.view(np.float32).copy(), None)
+        else:
+            stored, scales = self._encode(self.embed([entry["text"] for entry in self._entries]))
+            self._set_rows(stored, scales)
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE entries SET embedding = ? WHERE label = ?",
+                    [(self._blob(stored, scales, i), entry["label"]) for i, entry in enumerate(self._entries)],
+                )
+                self._store_embedder()
+
+        if not (reuse and self._load_index(self.cache_dir / self.INDEX_FILE)):
+            self._build_index()
+
+        with self._conn:
+            self._evict(len(self._entries) - self.max_entries)
+        self._expire()
+
+    @property
+    def _storage_name(self) -> str:
+        """Embedder and storage format of the stored embeddings."""
+        return f"{self.embedder_name}/int8" if self.quantize else self.embedder_name
+
+    def _store_embedder(self) -> None:
+        """Record which embedder and format produced the stored embeddings."""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES ('embedder', ?)",
+            (self._storage_name,),
+        )
+        self._embedder_stored = True
+
+    def _save_index(self) -> None:
+        """Write the HNSW index atomically, or remove a stale one."""
+        index_file = self.cache_dir / self.INDEX_FILE
+        if self._index is not None:
+            tmp_index = index_file.with_suffix(".tmp")
+            self._index.save_index(str(tmp_index))
+            os.replace(tmp_index, index_file)
+        elif index_file.exists():
+            index_file.unlink()
+        self._unsaved_index_items = 0
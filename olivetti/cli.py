@@ -2,112 +2,213 @@
 """Command-line interface for Olivetti writing assistant."""
 
 import sys
+import mmap
 import argparse
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 from olivetti import WritingAssistant, VoiceProfile
-from olivetti.config import Config
+from olivetti.config import get_config
+from olivetti.tokens import context_limit
+
+
+# Bytes of file tail read for `continue`, per token of model context. Generous,
+# since the assistant trims the text to the context window afterwards.
+TAIL_BYTES_PER_TOKEN = 16
+
+
+def _read_text(path, tail_bytes: Optional[int] = None) -> str:
+    """Read a UTF-8 text file, decoding straight from a memory map.
+    
+    Args:
+        path: File to read
+        tail_bytes: Only read this many bytes from the end of the file
+        
+    Returns:
+        File contents
+    """
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty files and some platforms/filesystems can't be mapped
+            data = f.read()
+            start = max(len(data) - tail_bytes, 0) if tail_bytes else 0
+            return _decode_from(memoryview(data), start)
+        
+        with mm:
+            start = max(len(mm) - tail_bytes, 0) if tail_bytes else 0
+            return _decode_from(memoryview(mm), start)
+
+
+def _decode_from(buffer: memoryview, start: int) -> str:
+    """Decode a buffer from `start`, skipping a partial UTF-8 character there."""
+    with buffer:
+        # Continuation bytes look like 0b10xxxxxx
+        while 0 < start < len(buffer) and buffer[start] & 0xC0 == 0x80:
+            start += 1
+        with buffer[start:] as view:
+            text = str(view, 'utf-8')
+    
+    # Match text-mode newline handling; returns the same string when there is no \r
+    return text.replace('\r\n', '\n')
+
+
+def _output(assistant: WritingAssistant, task: str, **kwargs) -> None:
+    """Print a generation result, streaming it when writing to a terminal."""
+    if not sys.stdout.isatty():
+        print(getattr(assistant, task)(**kwargs))
+        return
+    
+    for delta in assistant.stream(task, **kwargs):
+        sys.stdout.write(delta)
+        sys.stdout.flush()
+    print()
 
 
 def cmd_continue(args):
     """Continue writing command."""
-    assistant = WritingAssistant(voice_profile=args.profile)
+    assistant = WritingAssistant(voice_profile=args.profile, prewarm=True)
     
-    # Read text from stdin or file
+    # Read text from stdin or file; a continuation only needs the end
     if args.file:
-        with open(args.file, 'r') as f:
-            text = f.read()
+        text = _read_text(args.file, context_limit(assistant.model_name) * TAIL_BYTES_PER_TOKEN)
     elif not sys.stdin.isatty():
         text = sys.stdin.read()
     else:
         print("Please provide text via stdin or --file")
         return 1
     
-    result = assistant.continue_writing(text, args.length)
-    print(result)
+    _output(assistant, "continue_writing", text=text, length=args.length)
     return 0
 
 
 def cmd_rewrite(args):
     """Rewrite text command."""
-    assistant = WritingAssistant(voice_profile=args.profile)
+    assistant = WritingAssistant(voice_profile=args.profile, prewarm=True)
     
     # Read text from stdin or file
     if args.file:
-        with open(args.file, 'r') as f:
-            text = f.read()
+        text = _read_text(args.file)
     elif not sys.stdin.isatty():
         text = sys.stdin.read()
     else:
         print("Please provide text via stdin or --file")
         return 1
     
-    result = assistant.rewrite(text, args.instruction or "")
-    print(result)
+    _output(assistant, "rewrite", text=text, instruction=args.instruction or "")
     return 0
 
 
 def cmd_describe(args):
     """Describe subject command."""
-    assistant = WritingAssistant(voice_profile=args.profile)
+    assistant = WritingAssistant(voice_profile=args.profile, prewarm=True)
     
-    result = assistant.describe(args.subject, args.detail)
-    result = assistant.describe(args.subject, args.detail_level)
-    print(result)
+    _output(assistant, "describe", subject=args.subject, detail_level=args.detail)
     return 0
 
 
 def cmd_brainstorm(args):
     """Brainstorm ideas command."""
-    assistant = WritingAssistant(voice_profile=args.profile)
+    assistant = WritingAssistant(voice_profile=args.profile, prewarm=True)
     
-    result = assistant.brainstorm(args.topic, args.count)
-    print(result)
+    _output(assistant, "brainstorm", topic=args.topic, count=args.count)
     return 0
 
 
 def cmd_dialogue(args):
     """Generate dialogue command."""
-    assistant = WritingAssistant(voice_profile=args.profile)
+    assistant = WritingAssistant(voice_profile=args.profile, prewarm=True)
     
     characters = [c.strip() for c in args.characters.split(',')]
-    result = assistant.dialogue(characters, args.situation, args.length)
-    print(result)
+    _output(assistant, "dialogue", characters=characters, situation=args.situation, length=args.length)
     return 0
 
 
 def cmd_analyze(args):
     """Analyze text command."""
-    assistant = WritingAssistant(voice_profile=args.profile)
+    assistant = WritingAssistant(voice_profile=args.profile, prewarm=True)
     
     # Read text from stdin or file
     if args.file:
-        with open(args.file, 'r') as f:
-            text = f.read()
+        text = _read_text(args.file)
     elif not sys.stdin.isatty():
         text = sys.stdin.read()
     else:
         print("Please provide text via stdin or --file")
         return 1
     
-    result = assistant.analyze(text)
-    print(result)
+    _output(assistant, "analyze", text=text)
     return 0
 
 
-def cmd_profile_create(args):
-    """Create voice profile command."""
-    profile = VoiceProfile(args.name)
+# Batch task name -> (assistant task, keyword that receives the file text)
+BATCH_FILE_TASKS = {
+    "continue": ("continue_writing", "text"),
+    "rewrite": ("rewrite", "text"),
+    "describe": ("describe", "subject"),
+    "brainstorm": ("brainstorm", "topic"),
+    "analyze": ("analyze", "text"),
+}
+
+
+def cmd_batch(args):
+    """Run a task over every text file in a directory via the provider Batch API."""
+    assistant = WritingAssistant(voice_profile=args.profile)
     
-    if args.style:
-        profile.set_style_notes(args.style)
+    source_dir = Path(args.source)
+    # Skip outputs of earlier batch runs, named <stem>.<task>.txt
+    files = sorted(
+        path for path in source_dir.iterdir()
+        if path.is_file() and path.suffix in ('.txt', '.md')
+        and Path(path.stem).suffix[1:] not in BATCH_FILE_TASKS
+    )
+    if not files:
+        print(f"No .txt or .md files found in {source_dir}")
+        return 1
     
-    if args.genre:
-        for genre in args.genre:
-            profile.add_genre_preference(genre)
+    task, field = BATCH_FILE_TASKS[args.task]
+    inputs = []
+    for path in files:
+        kwargs = {field: _read_text(path)}
+        if task == "rewrite" and args.instruction:
+            kwargs["instruction"] = args.instruction
+        inputs.append(kwargs)
+    
+    print(f"Submitting {len(files)} {args.task} requests...")
+    results = assistant.run_batch_job(
+        task,
+        inputs,
+        poll_interval=args.poll_interval,
+        on_submit=lambda batch_id: print(f"Batch {batch_id} submitted; waiting for results..."),
+    )
     
-    profile.save()
+    out_dir = Path(args.out) if args.out else source_dir
+    out_dir.mkdir(parents=True, exist_ok=True)
+    failed = 0
+    for path, result in zip(files, results):
+        if result is None:
+            print(f"  Failed: {path.name}")
+            failed += 1
+            continue
+        out_file = out_dir / f"{path.stem}.{args.task}.txt"
+        out_file.write_text(result)
+        print(f"  Wrote {out_file}")
+    
+    return 1 if failed else 0
+
+
+def cmd_profile_create(args):
+    """Create voice profile command."""
+    with VoiceProfile(args.name) as profile:
+        if args.style:
+            profile.set_style_notes(args.style)
+        
+        if args.genre:
+            for genre in args.genre:
+                profile.add_genre_preference(genre)
+        
+        profile.save()
     print(f"Created voice profile: {args.name}")
     return 0
 
@@ -142,8 +243,7 @@ def cmd_profile_add_sample(args):
     
     # Read sample from stdin or file
     if args.file:
-        with open(args.file, 'r') as f:
-            text = f.read()
+        text = _read_text(args.file)
     elif not sys.stdin.isatty():
         text = sys.stdin.read()
     else:
@@ -157,95 +257,67 @@ def cmd_profile_add_sample(args):
 
 def cmd_config(args):
     """Configure Olivetti."""
-    config = Config()
-    
-    if args.set:
-        key, value = args.set.split('=', 1)
-        config.set(key, value)
-        print(f"Set {key} = {value}")
-    
-    elif args.get:
-        value = config.get(args.get)
-        print(f"{args.get} = {value}")
-    
-    elif args.list:
-        print("Current configuration:")
-        for key in ["api_provider", "model", "temperature", "max_tokens", "default_voice_profile"]:
-            value = config.get(key)
-            print(f"  {key} = {value}")
+    with get_config() as config:
+        if args.set:
+            key, value = args.set.split('=', 1)
+            config.set(key, value)
+            print(f"Set {key} = {value}")
+        
+        elif args.get:
+            value = config.get(args.get)
+            print(f"{args.get} = {value}")
+        
+        elif args.list:
+            print("Current configuration:")
+            for key in ["api_provider", "model", "temperature", "max_tokens", "default_voice_profile"]:
+                value = config.get(key)
+                print(f"  {key} = {value}")
     
     return 0
 
 
-def main():
-    """Main CLI entry point."""
-    parser = argparse.ArgumentParser(
-        description="Olivetti - Personal AI writing assistant for novelists",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-Examples:
-  # Continue writing
-  echo "The old house stood..." | olivetti continue
-  olivetti continue --file chapter.txt --length long
-  
-  # Rewrite text
-  echo "He walked slowly" | olivetti rewrite --instruction "more dramatic"
-  
-  # Describe something
-  olivetti describe "a mysterious forest clearing" --detail extensive
-  
-  # Brainstorm ideas
-  olivetti brainstorm "plot twists for mystery novel" --count 10
-  
-  # Generate dialogue
-  olivetti dialogue --characters "Alice, Bob" --situation "confronting a betrayal"
-  
-  # Create voice profile
-  olivetti profile create my-voice --style "literary fiction, introspective"
-  olivetti profile add-sample my-voice --file my-writing.txt
-  
-  # Configure
-  olivetti config --set api_provider=openai
-  olivetti config --set model=gpt-4
-  olivetti config --set default_voice_profile=my-voice
-        """
-    )
-    
-    subparsers = parser.add_subparsers(dest='command', help='Commands')
-    
-    # Continue command
+def _add_continue_parser(subparsers) -> None:
+    """Add the continue command."""
     continue_parser = subparsers.add_parser('continue', help='Continue writing from text')
     continue_parser.add_argument('--file', '-f', help='Read text from file')
     continue_parser.add_argument('--length', '-l', choices=['short', 'medium', 'long'], 
                                 default='medium', help='Length of continuation')
     continue_parser.add_argument('--profile', '-p', help='Voice profile to use')
     continue_parser.set_defaults(func=cmd_continue)
-    
-    # Rewrite command
+
+
+def _add_rewrite_parser(subparsers) -> None:
+    """Add the rewrite command."""
     rewrite_parser = subparsers.add_parser('rewrite', help='Rewrite text')
     rewrite_parser.add_argument('--file', '-f', help='Read text from file')
     rewrite_parser.add_argument('--instruction', '-i', help='How to rewrite')
     rewrite_parser.add_argument('--profile', '-p', help='Voice profile to use')
     rewrite_parser.set_defaults(func=cmd_rewrite)
-    
-    # Describe command
+
+
+def _add_describe_parser(subparsers) -> None:
+    """Add the describe command."""
     describe_parser = subparsers.add_parser('describe', help='Describe a subject')
     describe_parser.add_argument('subject', help='What to describe')
-    describe_parser.add_argument('--detail', '-d', choices=['brief', 'detailed', 'extensive'],
-    describe_parser.add_argument('--detail-level', '-d', choices=['brief', 'detailed', 'extensive'],
+    describe_parser.add_argument('--detail', '--detail-level', '-d', dest='detail',
+                                choices=['brief', 'detailed', 'extensive'],
                                 default='detailed', help='Level of detail')
     describe_parser.add_argument('--profile', '-p', help='Voice profile to use')
     describe_parser.set_defaults(func=cmd_describe)
-    
-    # Brainstorm command
+
+
+def _add_brainstorm_parser(subparsers) -> None:
+    """Add the brainstorm command."""
     brainstorm_parser = subparsers.add_parser('brainstorm', help='Brainstorm ideas')
     brainstorm_parser.add_argument('topic', help='Topic to brainstorm about')
     brainstorm_parser.add_argument('--count', '-c', type=int, default=5, 
                                   help='Number of ideas')
     brainstorm_parser.add_argument('--profile', '-p', help='Voice profile to use')
     brainstorm_parser.set_defaults(func=cmd_brainstorm)
-    
-    # Dialogue command
+
+
+def _add_dialogue_parser(subparsers) -> None:
+    """Add the dialogue command."""
     dialogue_parser = subparsers.add_parser('dialogue', help='Generate dialogue')
     dialogue_parser.add_argument('--characters', '-c', required=True,
                                help='Comma-separated character names')
@@ -255,14 +327,33 @@ Examples:
                                default='medium', help='Length of dialogue')
     dialogue_parser.add_argument('--profile', '-p', help='Voice profile to use')
     dialogue_parser.set_defaults(func=cmd_dialogue)
-    
-    # Analyze command
+
+
+def _add_analyze_parser(subparsers) -> None:
+    """Add the analyze command."""
     analyze_parser = subparsers.add_parser('analyze', help='Analyze text')
     analyze_parser.add_argument('--file', '-f', help='Read text from file')
     analyze_parser.add_argument('--profile', '-p', help='Voice profile to use')
     analyze_parser.set_defaults(func=cmd_analyze)
-    
-    # Profile commands
+
+
+def _add_batch_parser(subparsers) -> None:
+    """Add the batch command."""
+    batch_parser = subparsers.add_parser('batch', help='Run a task over a directory via the Batch API')
+    batch_parser.add_argument('--from', dest='source', required=True,
+                             help='Directory of .txt/.md files')
+    batch_parser.add_argument('--task', '-t', choices=list(BATCH_FILE_TASKS), required=True,
+                             help='Task to run on each file')
+    batch_parser.add_argument('--out', '-o', help='Output directory (defaults to --from)')
+    batch_parser.add_argument('--instruction', '-i', help='How to rewrite (rewrite task)')
+    batch_parser.add_argument('--poll-interval', type=float, default=30,
+                             help='Seconds between status checks')
+    batch_parser.add_argument('--profile', '-p', help='Voice profile to use')
+    batch_parser.set_defaults(func=cmd_batch)
+
+
+def _add_profile_parser(subparsers) -> None:
+    """Add the profile command."""
     profile_parser = subparsers.add_parser('profile', help='Manage voice profiles')
     profile_subparsers = profile_parser.add_subparsers(dest='profile_command')
     
@@ -289,15 +380,84 @@ Examples:
     profile_add_sample.add_argument('--file', '-f', help='Read sample from file')
     profile_add_sample.add_argument('--description', '-d', help='Sample description')
     profile_add_sample.set_defaults(func=cmd_profile_add_sample)
-    
-    # Config command
+
+
+def _add_config_parser(subparsers) -> None:
+    """Add the config command."""
     config_parser = subparsers.add_parser('config', help='Configure Olivetti')
     config_parser.add_argument('--set', help='Set config value (key=value)')
     config_parser.add_argument('--get', help='Get config value')
     config_parser.add_argument('--list', action='store_true', help='List all config values')
     config_parser.set_defaults(func=cmd_config)
+
+
+# Subcommand name -> function adding its parser
+COMMAND_PARSERS = {
+    'continue': _add_continue_parser,
+    'rewrite': _add_rewrite_parser,
+    'describe': _add_describe_parser,
+    'brainstorm': _add_brainstorm_parser,
+    'dialogue': _add_dialogue_parser,
+    'analyze': _add_analyze_parser,
+    'batch': _add_batch_parser,
+    'profile': _add_profile_parser,
+    'config': _add_config_parser,
+}
+
+
+def main(argv: Optional[List[str]] = None):
+    """Main CLI entry point.
+    
+    Args:
+        argv: Command-line arguments (defaults to sys.argv[1:])
+    """
+    parser = argparse.ArgumentParser(
+        description="Olivetti - Personal AI writing assistant for novelists",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Continue writing
+  echo "The old house stood..." | olivetti continue
+  olivetti continue --file chapter.txt --length long
+  
+  # Rewrite text
+  echo "He walked slowly" | olivetti rewrite --instruction "more dramatic"
+  
+  # Describe something
+  olivetti describe "a mysterious forest clearing" --detail extensive
+  
+  # Brainstorm ideas
+  olivetti brainstorm "plot twists for mystery novel" --count 10
+  
+  # Generate dialogue
+  olivetti dialogue --characters "Alice, Bob" --situation "confronting a betrayal"
+  
+  # Analyze every chapter in a directory via the Batch API
+  olivetti batch --from chapters/ --task analyze
+  
+  # Create voice profile
+  olivetti profile create my-voice --style "literary fiction, introspective"
+  olivetti profile add-sample my-voice --file my-writing.txt
+  
+  # Configure
+  olivetti config --set api_provider=openai
+  olivetti config --set model=gpt-4
+  olivetti config --set default_voice_profile=my-voice
+        """
+    )
+    
+    subparsers = parser.add_subparsers(dest='command', help='Commands')
+    
+    # Build only the requested command's parser; help and unknown commands need them all
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else None
+    if command in COMMAND_PARSERS:
+        COMMAND_PARSERS[command](subparsers)
+    else:
+        for add_parser in COMMAND_PARSERS.values():
+            add_parser(subparsers)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     if not args.command:
         parser.print_help()
@@ -2,12 +2,26 @@
 
 import os
 import json
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Union
+
+try:
+    import orjson
+except ImportError:  # Optional; stdlib json is used instead
+    orjson = None
 
 
 class Config:
-    """Manage configuration for Olivetti writing assistant."""
+    """Manage configuration for Olivetti writing assistant.
+    
+    Changes are written as soon as they are set. Use the config as a context
+    manager to batch several changes into one write:
+    
+        with Config() as config:
+            config.set("api_provider", "anthropic")
+            config.set("model", "claude-3-5-sonnet-20241022")
+    """
     
     def __init__(self, config_dir: Optional[Path] = None):
         """Initialize configuration.
@@ -22,20 +36,34 @@ class Config:
         self.config_dir = config_dir
         self.config_file = self.config_dir / "config.json"
         self.voice_profiles_dir = self.config_dir / "voice_profiles"
+        self.cache_dir = self.config_dir / "cache"
         
-        # Create directories if they don't exist
-        self.config_dir.mkdir(parents=True, exist_ok=True)
-        self.voice_profiles_dir.mkdir(parents=True, exist_ok=True)
+        # Create directories if they don't exist (one stat in the common case)
+        if not self.voice_profiles_dir.exists():
+            self.voice_profiles_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Unsaved changes, and nesting depth of `with` blocks
+        self._dirty = False
+        self._batch_depth = 0
         
         # Load or create config
         self._config = self._load_config()
     
+    def __enter__(self) -> "Config":
+        self._batch_depth += 1
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self.flush()
+    
     def _load_config(self) -> Dict[str, Any]:
         """Load configuration from file or create default."""
-        if self.config_file.exists():
-            with open(self.config_file, 'r') as f:
-                return json.load(f)
-        else:
+        try:
+            with open(self.config_file, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
             # Default configuration
             default_config = {
                 "api_provider": "openai",  # openai, anthropic, ollama, etc.
@@ -46,11 +74,30 @@ class Config:
             }
             self._save_config(default_config)
             return default_config
+        
+        config = orjson.loads(data) if orjson is not None else json.loads(data)
+        if not isinstance(config, dict):
+            raise ValueError(f"Invalid config file {self.config_file}: expected a JSON object")
+        return config
     
     def _save_config(self, config: Dict[str, Any]) -> None:
-        """Save configuration to file."""
-        with open(self.config_file, 'w') as f:
-            json.dump(config, f, indent=2)
+        """Save configuration to file atomically."""
+        if orjson is not None:
+            data = orjson.dumps(config, option=orjson.OPT_INDENT_2)
+        else:
+            data = json.dumps(config, indent=2).encode("utf-8")
+        
+        # Write a temporary file and rename it so a crash never leaves a partial config
+        tmp_file = self.config_file.with_suffix(".json.tmp")
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, self.config_file)
+    
+    def flush(self) -> None:
+        """Write pending changes to disk."""
+        if self._dirty:
+            self._save_config(self._config)
+            self._dirty = False
     
     def get(self, key: str, default: Any = None) -> Any:
         """Get configuration value."""
@@ -58,14 +105,37 @@ class Config:
     
     def set(self, key: str, value: Any) -> None:
         """Set configuration value."""
+        if key in self._config and self._config[key] == value:
+            return
+        
         self._config[key] = value
-        self._save_config(self._config)
+        self._dirty = True
+        if self._batch_depth == 0:
+            self.flush()
     
-    def get_api_key(self) -> Optional[str]:
-        """Get API key from environment or config."""
+    def get_api_key(self) -> Optional[Union[str, List[str]]]:
+        """Get API key from environment or config.
+        
+        The configured api_key may be a list of keys to spread requests
+        across. With a list of providers, a list with one key per provider
+        is returned.
+        """
         provider = self.get("api_provider", "openai")
+        api_key = self._config.get("api_key")
         
-        # Try environment variables first
+        if isinstance(provider, list):
+            keys = api_key if isinstance(api_key, list) else [api_key] * len(provider)
+            if len(keys) != len(provider):
+                # Mismatched lengths are reported by create_engine
+                return keys
+            return [self._env_api_key(name) or key for name, key in zip(provider, keys)]
+        
+        # Environment variables take precedence over the config file
+        return self._env_api_key(provider) or api_key
+    
+    @staticmethod
+    def _env_api_key(provider: str) -> Optional[str]:
+        """Get a provider's API key from its environment variable."""
         env_vars = {
             "openai": "OPENAI_API_KEY",
             "anthropic": "ANTHROPIC_API_KEY",
@@ -73,14 +143,19 @@ class Config:
         }
         
         env_var = env_vars.get(provider, f"{provider.upper()}_API_KEY")
-        api_key = os.environ.get(env_var)
-        
-        if api_key:
-            return api_key
-        
-        # Fall back to config file
-        return self._config.get("api_key")
+        return os.environ.get(env_var)
     
     def set_api_key(self, api_key: str) -> None:
         """Set API key in config."""
         self.set("api_key", api_key)
+
+
+@lru_cache(maxsize=4)
+def get_config(config_dir: Optional[Path] = None) -> Config:
+    """Get the shared Config for a directory, loading it only once per process.
+    
+    Args:
+        config_dir: Directory to store configuration files.
+                   Defaults to ~/.olivetti
+    """
+    return Config(config_dir)
@@ -0,0 +1,106 @@
+"""Text embeddings shared by the semantic cache and voice profiles."""
+
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+
+
+# Used when sentence-transformers is unavailable (or model_name is None)
+HASH_EMBEDDING_DIM = 384
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# Texts per sentence-transformers forward pass
+EMBEDDING_BATCH_SIZE = 32
+
+_TOKEN_RE = re.compile(r"\b\w+\b")
+
+
+def hash_embedding(text: str, dimensions: int = HASH_EMBEDDING_DIM) -> np.ndarray:
+    """Embed text as an L2-normalized bag-of-words hash vector.
+
+    Args:
+        text: Text to embed
+        dimensions: Vector dimensionality
+
+    Returns:
+        float32 vector of length `dimensions`
+    """
+    word_counts = Counter(_TOKEN_RE.findall(text.lower()))
+    buckets = np.fromiter(
+        (zlib.crc32(word.encode("utf-8")) % dimensions for word in word_counts),
+        dtype=np.int64,
+        count=len(word_counts),
+    )
+    counts = np.fromiter(word_counts.values(), dtype=np.float64, count=len(word_counts))
+    vector = np.bincount(buckets, weights=counts, minlength=dimensions).astype(np.float32)
+
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+class Embedder:
+    """Embed texts with sentence-transformers, falling back to hash vectors."""
+
+    def __init__(self, model_name: Optional[str] = DEFAULT_EMBEDDING_MODEL):
+        """Initialize embedder.
+
+        Args:
+            model_name: sentence-transformers model name, or None to use
+                hash embeddings
+        """
+        self.model_name = model_name
+        self._model = None
+
+    @property
+    def name(self) -> str:
+        """Identifier of the embedding function in use."""
+        if self._get_model() is not None:
+            return f"st:{self.model_name}"
+        return f"hash:{HASH_EMBEDDING_DIM}"
+
+    def _get_model(self):
+        """Load the sentence-transformers model on first use, if available."""
+        if self._model is None and self.model_name:
+            try:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name)
+            except Exception:
+                # Not installed or model unavailable; fall back to hash embeddings
+                self.model_name = None
+        return self._model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts as L2-normalized float32 rows.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Array of shape (len(texts), dim)
+        """
+        model = self._get_model()
+        if model is not None:
+            vectors = model.encode(
+                texts,
+                batch_size=EMBEDDING_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+            return np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+
+        if not texts:
+            return np.empty((0, HASH_EMBEDDING_DIM), dtype=np.float32)
+        return np.stack([hash_embedding(text) for text in texts])
+
+
+@lru_cache(maxsize=4)
+def get_embedder(model_name: Optional[str] = DEFAULT_EMBEDDING_MODEL) -> Embedder:
+    """Get the shared Embedder for a model, so it is loaded once per process."""
+    return Embedder(model_name)
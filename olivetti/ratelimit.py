@@ -0,0 +1,297 @@
+"""Adaptive per-provider rate limiting for API engines."""
+
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from .ai_engine import AIEngine, _is_rate_limited, _retry_after
+from . import tokens
+
+
+# Rates shrink by this factor on every 429...
+RATE_DECREASE = 0.8
+# ...and grow back by this factor after each interval without one
+RATE_INCREASE = 1.05
+RATE_INCREASE_INTERVAL = 30
+
+# Rates never drop below this fraction of the configured limit
+MIN_RATE_FRACTION = 0.05
+
+# Pause after a 429 that has no Retry-After header
+DEFAULT_RATE_LIMIT_PAUSE = 1.0
+
+# Retries of a rate-limited request before giving up
+RATE_LIMIT_MAX_RETRIES = 3
+
+
+class TokenBucket:
+    """Token bucket holding up to one minute's worth of tokens."""
+
+    def __init__(self, per_minute: float):
+        """Initialize token bucket.
+
+        Args:
+            per_minute: Refill rate in tokens per minute
+        """
+        self.per_minute = per_minute
+        self._level = per_minute
+        self._updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take tokens from the bucket, going into debt if it runs short.
+
+        Later callers queue behind the debt, so waiters are served in order.
+
+        Args:
+            amount: Tokens to take; capped at the bucket size
+            now: Current time.monotonic()
+
+        Returns:
+            Seconds to wait before the tokens are available
+        """
+        rate = self.per_minute / 60
+        self._level = min(self.per_minute, self._level + (now - self._updated) * rate)
+        self._updated = now
+        self._level -= min(amount, self.per_minute)
+        return max(0.0, -self._level / rate)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one API key.
+
+    The limits adapt to the provider's feedback: each 429 lowers them and
+    pauses for the Retry-After interval, and they creep back up towards the
+    configured maximum while requests succeed.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        rates: Optional[Dict[str, float]] = None,
+        on_adjust: Optional[Callable[[Dict[str, float]], None]] = None,
+    ):
+        """Initialize rate limiter.
+
+        Args:
+            requests_per_minute: Maximum requests per minute, or None for no limit
+            tokens_per_minute: Maximum prompt plus completion tokens per minute,
+                or None for no limit
+            rates: Rates learned by an earlier run to start from, as returned
+                by `rates`
+            on_adjust: Called with the new `rates` whenever they change
+        """
+        self.limits = {
+            "requests_per_minute": requests_per_minute,
+            "tokens_per_minute": tokens_per_minute,
+        }
+        self.on_adjust = on_adjust
+
+        self._buckets: Dict[str, TokenBucket] = {}
+        for name, limit in self.limits.items():
+            if limit:
+                start = (rates or {}).get(name) or limit
+                self._buckets[name] = TokenBucket(min(max(start, limit * MIN_RATE_FRACTION), limit))
+
+        self._paused_until = 0.0
+        self._last_change = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def counts_tokens(self) -> bool:
+        """Whether requests need a token estimate."""
+        return "tokens_per_minute" in self._buckets
+
+    @property
+    def rates(self) -> Dict[str, float]:
+        """Current limits, per minute."""
+        return {name: bucket.per_minute for name, bucket in self._buckets.items()}
+
+    def reserve(self, token_count: int = 0) -> float:
+        """Reserve capacity for one request.
+
+        Args:
+            token_count: Estimated prompt plus completion tokens
+
+        Returns:
+            Seconds to wait before sending the request
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._paused_until - now)
+            for name, amount in (("requests_per_minute", 1), ("tokens_per_minute", token_count)):
+                bucket = self._buckets.get(name)
+                if bucket is not None:
+                    delay = max(delay, bucket.reserve(amount, now))
+            return delay
+
+    def on_success(self) -> None:
+        """Record a successful request, raising the limits if they were lowered."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_change < RATE_INCREASE_INTERVAL:
+                return
+
+            changed = False
+            for name, bucket in self._buckets.items():
+                raised = min(bucket.per_minute * RATE_INCREASE, self.limits[name])
+                if raised != bucket.per_minute:
+                    bucket.per_minute = raised
+                    changed = True
+            self._last_change = now
+            rates = self.rates
+
+        if changed and self.on_adjust:
+            self.on_adjust(rates)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        """Record a 429: pause, and lower the limits.
+
+        Args:
+            retry_after: Seconds the provider asked to wait, if it said
+        """
+        with self._lock:
+            now = time.monotonic()
+            pause = retry_after if retry_after is not None else DEFAULT_RATE_LIMIT_PAUSE
+            self._paused_until = max(self._paused_until, now + pause)
+            for name, bucket in self._buckets.items():
+                bucket.per_minute = max(bucket.per_minute * RATE_DECREASE, self.limits[name] * MIN_RATE_FRACTION)
+            self._last_change = now
+            rates = self.rates
+
+        if rates and self.on_adjust:
+            self.on_adjust(rates)
+
+
+# Limiters shared by every engine using the same provider and API key
+_limiters: Dict[Tuple[str, Optional[str]], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def key_fingerprint(api_key: Optional[str]) -> str:
+    """Short identifier for an API key that reveals nothing about the key itself."""
+    if not api_key:
+        return "default"
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def shared_rate_limiter(
+    provider: str,
+    api_key: Optional[str],
+    on_adjust: Optional[Callable[[Dict[str, float]], None]] = None,
+    **kwargs,
+) -> RateLimiter:
+    """Get the process-wide RateLimiter for an API key, creating it if needed.
+
+    Args:
+        provider: Provider name
+        api_key: API key the limits apply to
+        on_adjust: Called with the new rates whenever they change; replaces
+            any earlier callback, so the latest caller receives updates
+        **kwargs: Other RateLimiter arguments, used only when creating it
+    """
+    with _limiters_lock:
+        key = (provider, api_key)
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(**kwargs)
+        limiter = _limiters[key]
+        if on_adjust is not None:
+            limiter.on_adjust = on_adjust
+        return limiter
+
+
+class RateLimitedEngine(AIEngine):
+    """Engine wrapper that waits for rate-limit capacity before each request.
+
+    Rate-limited requests are retried once the limiter's pause has passed.
+    """
+
+    def __init__(self, engine: AIEngine, limiter: RateLimiter, max_retries: int = RATE_LIMIT_MAX_RETRIES):
+        """Initialize rate-limited engine.
+
+        Args:
+            engine: Engine to send requests with
+            limiter: Limits to respect
+            max_retries: Retries of a rate-limited request; use 0 when another
+                layer (such as MultiEngine) handles retries
+        """
+        self.engine = engine
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.provider = engine.provider
+        self.model = getattr(engine, "model", None)
+
+    def _cost(self, prompt: str, max_tokens: int) -> int:
+        """Tokens a request counts against the tokens-per-minute limit."""
+        if not self.limiter.counts_tokens:
+            return 0
+        return tokens.count(self.model, prompt) + max_tokens
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        """Feed a failure back to the limiter and decide whether to retry."""
+        if not _is_rate_limited(error):
+            return False
+        self.limiter.on_rate_limited(_retry_after(error))
+        return attempt < self.max_retries
+
+    def generate(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> str:
+        """Generate text once the rate limits allow it."""
+        cost = self._cost(prompt, max_tokens)
+        for attempt in range(self.max_retries + 1):
+            time.sleep(self.limiter.reserve(cost))
+            try:
+                result = self.engine.generate(prompt, max_tokens, temperature)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                continue
+            self.limiter.on_success()
+            return result
+
+    def stream(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> Iterator[str]:
+        """Stream text once the rate limits allow it.
+
+        A rate-limited request is retried only if nothing was yielded yet.
+        """
+        cost = self._cost(prompt, max_tokens)
+        for attempt in range(self.max_retries + 1):
+            time.sleep(self.limiter.reserve(cost))
+            started = False
+            try:
+                for chunk in self.engine.stream(prompt, max_tokens, temperature):
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if started or not self._should_retry(e, attempt):
+                    raise
+                continue
+            self.limiter.on_success()
+            return
+
+    async def agenerate(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.8) -> str:
+        """Generate text once the rate limits allow it, without blocking the event loop."""
+        import asyncio
+        cost = self._cost(prompt, max_tokens)
+        for attempt in range(self.max_retries + 1):
+            await asyncio.sleep(self.limiter.reserve(cost))
+            try:
+                result = await self.engine.agenerate(prompt, max_tokens, temperature)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                continue
+            self.limiter.on_success()
+            return result
+
+    def prewarm(self) -> None:
+        """Open a connection to the provider in the background."""
+        self.engine.prewarm()
+
+    def close(self) -> None:
+        """Release pooled connections."""
+        self.engine.close()
+
+    async def aclose(self) -> None:
+        """Release connections held by the async client."""
+        await self.engine.aclose()
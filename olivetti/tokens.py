@@ -0,0 +1,135 @@
+"""Token counting and context-window-aware truncation."""
+
+from functools import lru_cache
+from typing import Optional
+
+
+# Context window sizes by model name prefix; the longest matching prefix wins
+CONTEXT_LIMITS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-3.5-turbo": 16385,
+    "claude": 200000,
+    "llama2": 4096,
+    "llama3": 8192,
+}
+DEFAULT_CONTEXT_LIMIT = 8192
+
+# Rough characters per token, used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+# Inserted where the middle of a text was cut out
+ELISION_MARKER = "\n\n[...]\n\n"
+
+
+def context_limit(model: Optional[str]) -> int:
+    """Get the context window size for a model.
+
+    Args:
+        model: Model name
+
+    Returns:
+        Maximum prompt plus completion tokens
+    """
+    if not model:
+        return DEFAULT_CONTEXT_LIMIT
+
+    best = ""
+    for prefix in CONTEXT_LIMITS:
+        if model.startswith(prefix) and len(prefix) > len(best):
+            best = prefix
+    return CONTEXT_LIMITS[best] if best else DEFAULT_CONTEXT_LIMIT
+
+
+@lru_cache(maxsize=8)
+def _encoder(model: Optional[str]):
+    """Load the tiktoken encoder for a model, or None if unavailable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model or "")
+    except KeyError:
+        # Not an OpenAI model; cl100k_base is a close approximation
+        pass
+    except Exception:
+        # Encoding files could not be loaded (e.g. offline)
+        return None
+
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count(model: Optional[str], text: str) -> int:
+    """Count the tokens in text for a model.
+
+    Uses tiktoken when available and otherwise estimates from length.
+
+    Args:
+        model: Model name
+        text: Text to count
+
+    Returns:
+        Number of tokens
+    """
+    encoder = _encoder(model)
+    if encoder is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate(model: Optional[str], text: str, budget: int, keep: str = "tail") -> str:
+    """Shorten text to fit within a token budget.
+
+    Args:
+        model: Model name
+        text: Text to shorten
+        budget: Maximum tokens to keep
+        keep: Which part to keep: "head", "tail", or "head_tail" (the start
+            and end, with the middle elided)
+
+    Returns:
+        The text, or a shortened version of it
+    """
+    budget = max(budget, 0)
+
+    # A token is at least one UTF-8 byte, so this text fits without encoding it
+    if len(text) * 4 <= budget:
+        return text
+
+    encoder = _encoder(model)
+    if encoder is None:
+        units = text
+        limit = budget * CHARS_PER_TOKEN
+        marker_size = len(ELISION_MARKER)
+        # Slices of a str are already text
+        decode = str
+    else:
+        units = encoder.encode(text, disallowed_special=())
+        limit = budget
+        marker_size = len(encoder.encode(ELISION_MARKER))
+        decode = encoder.decode
+
+    if len(units) <= limit:
+        return text
+
+    if keep == "head":
+        return decode(units[:limit])
+    if keep == "tail":
+        return decode(units[len(units) - limit:]) if limit else ""
+    if keep == "head_tail":
+        # The marker counts against the budget too
+        room = limit - marker_size
+        if room <= 0:
+            return decode(units[:limit])
+        half = room // 2
+        return decode(units[:half]) + ELISION_MARKER + decode(units[len(units) - (room - half):])
+
+    raise ValueError(f"Unknown keep mode: {keep}. Supported: head, tail, head_tail")
@@ -1,13 +1,101 @@
 """Voice profile system for capturing and maintaining writer's style."""
 
 import json
+import os
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set, Tuple, TYPE_CHECKING
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:  # Optional; stdlib json is used instead
+    orjson = None
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def _dumps(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON; profiles are machine-read, not edited."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _loads(data: bytes) -> Any:
+    """Parse JSON from bytes."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+# Writing samples shown in the AI context, and the characters kept of each
+CONTEXT_SAMPLES = 3
+SAMPLE_PREVIEW_CHARS = 500
+
+# Bytes read at a time when scanning the samples file
+SAMPLES_READ_BLOCK = 64 * 1024
+
+
+def _read_last_lines(path: Path, count: int) -> List[bytes]:
+    """Read the last lines of a file, reading backwards from its end.
+    
+    Only the tail of the file is read, however many lines precede it.
+    """
+    if count <= 0:
+        return []
+    
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b""
+        # count + 1 newlines guarantee that the last `count` lines are complete
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(SAMPLES_READ_BLOCK, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    
+    return [line for line in data.split(b"\n") if line.strip()][-count:]
+
+
+def _new_profile_data(name: str, now: str) -> Dict[str, Any]:
+    """Metadata for a new, empty profile."""
+    return {
+        "name": name,
+        "created_at": now,
+        "updated_at": now,
+        "style_notes": "",
+        "genre_preferences": [],
+        "vocabulary_preferences": [],
+        "sentence_structure_notes": "",
+        "pacing_preferences": "",
+        "character_voice_notes": "",
+    }
+
+
+def _preview(sample: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of a writing sample shown in the AI context."""
+    return {
+        "description": sample.get("description", ""),
+        "text_preview": sample["text"][:SAMPLE_PREVIEW_CHARS],
+    }
+
 
 class VoiceProfile:
-    """Represents a writer's unique voice and style."""
+    """Represents a writer's unique voice and style.
+    
+    Every change is saved immediately. To make several changes with a single
+    write, use the profile as a context manager:
+    
+        with VoiceProfile("noir") as profile:
+            profile.set_style_notes("Terse, hard-boiled")
+            profile.add_genre_preference("crime")
+    """
+    
+    # Profile directories already created by this process
+    _ensured_dirs: Set[Path] = set()
+    
+    # Profile files this process has read or written, by path:
+    # ((st_mtime_ns, st_size), file contents, save() state)
+    _loaded: Dict[Path, Tuple[Tuple[int, int], bytes, bytes]] = {}
     
     def __init__(self, name: str, config_dir: Optional[Path] = None):
         """Initialize voice profile.
@@ -22,37 +110,169 @@ class VoiceProfile:
             config_dir = Path.home() / ".olivetti"
         
         self.profile_dir = config_dir / "voice_profiles"
-        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        if self.profile_dir not in VoiceProfile._ensured_dirs:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            VoiceProfile._ensured_dirs.add(self.profile_dir)
         
         self.profile_file = self.profile_dir / f"{name}.json"
+        self.samples_file = self.profile_dir / f"{name}.samples.jsonl"
+        self.embeddings_file = self.profile_dir / f"{name}.embeddings.f32"
+        
+        # Writing samples, read from samples_file on first use
+        self._samples: Optional[List[Dict[str, Any]]] = None
+        
+        # Serialized metadata (minus updated_at) as last written, or None
+        # if the profile isn't on disk yet
+        self._saved_state: Optional[bytes] = None
         
         # Load or initialize profile data
         self.data = self._load_profile()
+        
+        # Mirror of genre_preferences for constant-time membership checks,
+        # and the list it mirrors
+        self._genres: Set[str] = set()
+        self._genres_source: Optional[List[str]] = None
+        
+        # Result of the last get_context_for_ai call, cleared on save
+        self._context_cache: Optional[str] = None
+        
+        # Unsaved changes, and nesting depth of `with` blocks deferring saves
+        self._dirty = False
+        self._batch_depth = 0
+        
+        # Timestamp shared by every change in the current `with` block
+        self._batch_time: Optional[str] = None
+        
+        # One normalized row per writing sample, loaded on first use
+        self._sample_embeddings = None
+    
+    def __enter__(self) -> "VoiceProfile":
+        self._batch_depth += 1
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self._batch_time = None
+            self.flush()
+    
+    def _now(self) -> str:
+        """Current time as an ISO string, computed once per `with` block."""
+        if self._batch_depth == 0:
+            return datetime.now().isoformat()
+        if self._batch_time is None:
+            self._batch_time = datetime.now().isoformat()
+        return self._batch_time
     
     def _load_profile(self) -> Dict[str, Any]:
         """Load profile from file or create new."""
-        if self.profile_file.exists():
-            with open(self.profile_file, 'r') as f:
-                return json.load(f)
-        else:
-            return {
-                "name": self.name,
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat(),
-                "writing_samples": [],
-                "style_notes": "",
-                "genre_preferences": [],
-                "vocabulary_preferences": [],
-                "sentence_structure_notes": "",
-                "pacing_preferences": "",
-                "character_voice_notes": "",
-            }
+        try:
+            stat = os.stat(self.profile_file)
+            cached = VoiceProfile._loaded.get(self.profile_file)
+            if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+                # Unchanged since this process last read or wrote it
+                self._saved_state = cached[2]
+                return _loads(cached[1])
+            
+            # One read, then decode from memory rather than from a file object
+            contents = self.profile_file.read_bytes()
+        except FileNotFoundError:
+            return _new_profile_data(self.name, datetime.now().isoformat())
+        
+        data = _loads(contents)
+        
+        # Older profiles kept their samples inline; move them to the sidecar once
+        legacy_samples = data.pop("writing_samples", None)
+        if legacy_samples is not None:
+            if legacy_samples and not self.samples_file.exists():
+                self._append_samples(legacy_samples)
+                data["sample_previews"] = [_preview(sample) for sample in legacy_samples[-CONTEXT_SAMPLES:]]
+            self._saved_state = self._state(data)
+            self._write_profile(data)
+            return data
+        
+        self._saved_state = self._state(data)
+        VoiceProfile._loaded[self.profile_file] = ((stat.st_mtime_ns, stat.st_size), contents, self._saved_state)
+        return data
+    
+    @staticmethod
+    def _state(data: Dict[str, Any]) -> bytes:
+        """Serialize the profile metadata that save() compares."""
+        return _dumps({key: value for key, value in data.items() if key != "updated_at"})
     
     def save(self) -> None:
-        """Save profile to file."""
-        self.data["updated_at"] = datetime.now().isoformat()
-        with open(self.profile_file, 'w') as f:
-            json.dump(self.data, f, indent=2)
+        """Save profile to file, or when the enclosing `with` block exits.
+        
+        Does nothing if the profile hasn't changed since it was last saved.
+        """
+        state = self._state(self.data)
+        if state == self._saved_state:
+            return
+        self._saved_state = state
+        
+        self.data["updated_at"] = self._now()
+        self._context_cache = None
+        self._dirty = True
+        if self._batch_depth == 0:
+            self.flush()
+    
+    def flush(self) -> None:
+        """Write pending changes to disk."""
+        if self._dirty:
+            self._write_profile(self.data)
+            self._dirty = False
+    
+    def _write_profile(self, data: Dict[str, Any]) -> None:
+        """Write profile metadata to the profile file atomically."""
+        # Serialize to one buffer and write it with a single call, via a
+        # temporary file so a crash never leaves a partial profile
+        contents = _dumps(data)
+        tmp_file = self.profile_file.with_suffix(".json.tmp")
+        tmp_file.write_bytes(contents)
+        os.replace(tmp_file, self.profile_file)
+        
+        stat = os.stat(self.profile_file)
+        VoiceProfile._loaded[self.profile_file] = ((stat.st_mtime_ns, stat.st_size), contents, self._saved_state)
+    
+    @property
+    def writing_samples(self) -> List[Dict[str, Any]]:
+        """All writing samples, oldest first."""
+        if self._samples is None:
+            try:
+                with open(self.samples_file, 'rb') as f:
+                    self._samples = [_loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                self._samples = []
+        return self._samples
+    
+    def recent_samples(self, count: int) -> List[Dict[str, Any]]:
+        """The newest writing samples, oldest first, reading only those lines."""
+        if self._samples is not None:
+            return self._samples[-count:] if count > 0 else []
+        
+        try:
+            lines = _read_last_lines(self.samples_file, count)
+        except FileNotFoundError:
+            return []
+        return [_loads(line) for line in lines]
+    
+    @property
+    def sample_count(self) -> int:
+        """Number of writing samples."""
+        if self._samples is not None:
+            return len(self._samples)
+        
+        # One sample per line; count newlines without decoding the text
+        try:
+            with open(self.samples_file, 'rb') as f:
+                return sum(block.count(b"\n") for block in iter(lambda: f.read(SAMPLES_READ_BLOCK), b""))
+        except FileNotFoundError:
+            return 0
+    
+    def _append_samples(self, samples: List[Dict[str, Any]]) -> None:
+        """Append samples to the samples file, one JSON object per line."""
+        with open(self.samples_file, 'ab') as f:
+            f.write(b"".join(_dumps(sample) + b"\n" for sample in samples))
     
     def add_writing_sample(self, text: str, description: str = "") -> None:
         """Add a writing sample to learn from.
@@ -61,27 +281,141 @@ class VoiceProfile:
             text: The writing sample text
             description: Optional description of the sample
         """
+        import numpy as np
+        from .embeddings import get_embedder
+        
+        # Embed only the new sample and append its row; earlier rows are
+        # already on disk
+        embedding = np.ascontiguousarray(get_embedder().embed([text]), dtype=np.float32)
+        existing = self.sample_embeddings
+        if existing.shape[0]:
+            with open(self.embeddings_file, 'ab') as f:
+                f.write(embedding.tobytes())
+            self._sample_embeddings = np.concatenate([existing, embedding])
+        else:
+            self._save_sample_embeddings(embedding)
+        
         sample = {
             "text": text,
             "description": description,
-            "added_at": datetime.now().isoformat(),
+            "added_at": self._now(),
         }
-        self.data["writing_samples"].append(sample)
+        # One appended line, instead of rewriting every earlier sample
+        self._append_samples([sample])
+        if self._samples is not None:
+            self._samples.append(sample)
+        
+        # Keep the newest previews in the metadata, so building the AI
+        # context never reads sample bodies
+        previews = self.data.get("sample_previews", [])
+        self.data["sample_previews"] = (previews + [_preview(sample)])[-CONTEXT_SAMPLES:]
         self.save()
     
+    @property
+    def sample_embeddings(self) -> "np.ndarray":
+        """L2-normalized embeddings of the writing samples, one row per sample.
+        
+        Loaded memory-mapped from the profile's raw float32 sidecar; all
+        samples are embedded in one batch if the file is missing, stale, or
+        was written by a different embedder.
+        """
+        if self._sample_embeddings is None:
+            self._sample_embeddings = self._load_sample_embeddings()
+        return self._sample_embeddings
+    
+    def _load_sample_embeddings(self) -> "np.ndarray":
+        """Load persisted sample embeddings, recomputing them if they don't match."""
+        import numpy as np
+        from .embeddings import get_embedder
+        
+        embedder = get_embedder()
+        sample_count = self.sample_count
+        if not sample_count:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        dim = self.data.get("sample_embedding_dim")
+        if self.data.get("sample_embedder") == embedder.name and dim:
+            try:
+                raw = np.memmap(self.embeddings_file, dtype=np.float32, mode="r")
+            except (OSError, ValueError):
+                raw = None
+            # A partly written row leaves a size that isn't a whole number of rows
+            if raw is not None and raw.size == sample_count * dim:
+                return raw.reshape(sample_count, dim)
+        
+        # All samples in one batch rather than one encode call each
+        embeddings = embedder.embed([sample["text"] for sample in self.writing_samples])
+        self._save_sample_embeddings(embeddings)
+        self.save()
+        return embeddings
+    
+    def _save_sample_embeddings(self, embeddings: "np.ndarray") -> None:
+        """Atomically write sample embeddings and record the embedder used."""
+        import numpy as np
+        from .embeddings import get_embedder
+        
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        tmp_file = self.embeddings_file.with_suffix(".f32.tmp")
+        tmp_file.write_bytes(embeddings.tobytes())
+        os.replace(tmp_file, self.embeddings_file)
+        
+        self._sample_embeddings = embeddings
+        self.data["sample_embedder"] = get_embedder().name
+        self.data["sample_embedding_dim"] = embeddings.shape[1]
+    
+    def similar_samples(self, text: str, count: int = 3) -> List[Dict[str, Any]]:
+        """Find the writing samples closest in meaning to a text.
+        
+        Args:
+            text: Text to compare against
+            count: Maximum number of samples to return
+            
+        Returns:
+            Samples ordered from most to least similar
+        """
+        import numpy as np
+        from .embeddings import get_embedder
+        
+        samples = self.writing_samples
+        if not samples or count <= 0:
+            return []
+        
+        query = get_embedder().embed([text])[0]
+        similarities = self.sample_embeddings @ query
+        order = np.argsort(-similarities, kind="stable")[:count]
+        return [samples[i] for i in order]
+    
     def set_style_notes(self, notes: str) -> None:
         """Set general style notes."""
+        if self.data.get("style_notes") == notes:
+            return
         self.data["style_notes"] = notes
         self.save()
     
     def add_genre_preference(self, genre: str) -> None:
         """Add a genre preference."""
-        if genre not in self.data["genre_preferences"]:
-            self.data["genre_preferences"].append(genre)
+        genres = self.data.setdefault("genre_preferences", [])
+        if genres is not self._genres_source or len(genres) != len(self._genres):
+            # First use, or the list was replaced or resized directly
+            self._genres = set(genres)
+            self._genres_source = genres
+        
+        if genre not in self._genres:
+            self._genres.add(genre)
+            genres.append(genre)
             self.save()
     
     def get_context_for_ai(self) -> str:
-        """Generate context string for AI prompts."""
+        """Generate context string for AI prompts.
+        
+        The result is reused until the profile is saved again.
+        """
+        if self._context_cache is None:
+            self._context_cache = self._build_context()
+        return self._context_cache
+    
+    def _build_context(self) -> str:
+        """Format profile data as context for AI prompts."""
         context_parts = []
         
         if self.data.get("style_notes"):
@@ -98,14 +432,17 @@ class VoiceProfile:
             context_parts.append(f"Pacing: {self.data['pacing_preferences']}")
         
         # Include recent writing samples
-        samples = self.data.get("writing_samples", [])
-        if samples:
+        previews = self.data.get("sample_previews")
+        if previews is None:
+            # Written before previews were stored
+            previews = [_preview(sample) for sample in self.recent_samples(CONTEXT_SAMPLES)]
+        if previews:
             context_parts.append("\nWriting Samples:")
-            for i, sample in enumerate(samples[-3:], 1):  # Last 3 samples
+            for i, sample in enumerate(previews, 1):
                 context_parts.append(f"\nSample {i}:")
                 if sample.get("description"):
                     context_parts.append(f"  ({sample['description']})")
-                context_parts.append(f"  {sample['text'][:500]}...")  # First 500 chars
+                context_parts.append(f"  {sample['text_preview']}...")
         
         return "\n".join(context_parts)
     
@@ -122,16 +459,47 @@ class VoiceProfile:
         if config_dir is None:
             config_dir = Path.home() / ".olivetti"
         
-        profile_dir = config_dir / "voice_profiles"
-        
-        if not profile_dir.exists():
+        try:
+            # One directory read; DirEntry carries the file type without a stat
+            with os.scandir(config_dir / "voice_profiles") as entries:
+                return sorted(
+                    entry.name[:-len(".json")]
+                    for entry in entries
+                    if entry.name.endswith(".json") and entry.is_file(follow_symlinks=False)
+                )
+        except FileNotFoundError:
             return []
+    
+    @classmethod
+    def create_many(cls, names: List[str], config_dir: Optional[Path] = None) -> List[str]:
+        """Create several empty voice profiles at once.
+        
+        Args:
+            names: Names of the profiles to create
+            config_dir: Configuration directory
+            
+        Returns:
+            Names of the profiles created; names that already exist are skipped
+        """
+        if config_dir is None:
+            config_dir = Path.home() / ".olivetti"
+        
+        profile_dir = config_dir / "voice_profiles"
+        if profile_dir not in cls._ensured_dirs:
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            cls._ensured_dirs.add(profile_dir)
         
-        profiles = []
-        for file in profile_dir.glob("*.json"):
-            profiles.append(file.stem)
+        now = datetime.now().isoformat()
+        created = []
+        for name in names:
+            try:
+                with open(profile_dir / f"{name}.json", 'xb') as f:
+                    f.write(_dumps(_new_profile_data(name, now)))
+            except FileExistsError:
+                continue
+            created.append(name)
         
-        return sorted(profiles)
+        return created
     
     @classmethod
     def delete_profile(cls, name: str, config_dir: Optional[Path] = None) -> bool:
@@ -149,8 +517,16 @@ class VoiceProfile:
         
         profile_file = config_dir / "voice_profiles" / f"{name}.json"
         
-        if profile_file.exists():
-            profile_file.unlink()
-            return True
+        cls._loaded.pop(profile_file, None)
+        try:
+            os.unlink(profile_file)
+        except FileNotFoundError:
+            return False
         
-        return False
+        # .npy held embeddings before they moved to an appendable raw file
+        for sidecar in (".samples.jsonl", ".embeddings.f32", ".npy"):
+            try:
+                os.unlink(profile_file.with_suffix(sidecar))
+            except FileNotFoundError:
+                pass
+        return True
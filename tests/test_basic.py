@@ -4,9 +4,22 @@ import pytest
 import tempfile
 import json
 from pathlib import Path
+from types import SimpleNamespace
 
-from olivetti.config import Config
+from olivetti.config import Config, get_config
 from olivetti.voice_profile import VoiceProfile
+from olivetti.cache import SemanticCache
+from olivetti.assistant import WritingAssistant
+from olivetti.ai_engine import AIEngine, MultiEngine, create_engine
+from olivetti.ratelimit import RateLimiter, RateLimitedEngine, key_fingerprint
+from olivetti import tokens
+
+
+class EchoEngine(AIEngine):
+    """Engine that returns the end of the prompt without calling an API."""
+    
+    def generate(self, prompt: str, max_tokens: int, temperature: float) -> str:
+        return prompt.splitlines()[-3]
 
 
 class TestConfig:
@@ -34,91 +47,353 @@ class TestConfig:
             # Test custom value
             config.set("custom_key", "custom_value")
             assert config.get("custom_key") == "custom_value"
+    
+    def test_config_batched_writes(self):
+        """Test that changes inside a with block are written once on exit."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with Config(Path(tmpdir)) as config:
+                config.set("model", "gpt-4o")
+                config.set("temperature", 0.5)
+                assert Config(Path(tmpdir)).get("model") == "gpt-4"
+            
+            reloaded = Config(Path(tmpdir))
+            assert reloaded.get("model") == "gpt-4o"
+            assert reloaded.get("temperature") == 0.5
+            assert not (Path(tmpdir) / "config.json.tmp").exists()
+    
+    def test_get_config_shared(self):
+        """Test that get_config reuses one Config per directory."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            assert get_config(Path(tmpdir)) is get_config(Path(tmpdir))
 
 
 class TestVoiceProfile:
     """Test voice profile system."""
     
-    def test_profile_creation(self):
+    @pytest.fixture
+    def profile(self, tmp_path):
+        """A new, empty voice profile in a temporary directory."""
+        return VoiceProfile("test-profile", tmp_path)
+    
+    def test_profile_creation(self, profile):
         """Test creating a voice profile."""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            profile = VoiceProfile("test-profile", Path(tmpdir))
-            assert profile.name == "test-profile"
-            assert profile.data["name"] == "test-profile"
+        assert profile.name == "test-profile"
+        assert profile.data["name"] == "test-profile"
     
-    def test_profile_save_load(self):
+    def test_profile_save_load(self, profile, tmp_path):
         """Test saving and loading profiles."""
+        # Save profile
+        profile.set_style_notes("Test style notes")
+        profile.save()
+        
+        # Load profile
+        reloaded = VoiceProfile("test-profile", tmp_path)
+        assert reloaded.data["style_notes"] == "Test style notes"
+    
+    def test_add_writing_sample(self, profile, tmp_path):
+        """Test adding writing samples."""
+        sample_text = "This is a test writing sample."
+        profile.add_writing_sample(sample_text, "Test sample")
+        
+        assert len(profile.writing_samples) == 1
+        assert profile.writing_samples[0]["text"] == sample_text
+        
+        # Samples live in an append-only sidecar, not the profile JSON
+        reloaded = VoiceProfile("test-profile", tmp_path)
+        assert "writing_samples" not in json.loads(profile.profile_file.read_text())
+        assert reloaded.recent_samples(3)[0]["description"] == "Test sample"
+    
+    def test_sample_embeddings_persisted(self, profile, tmp_path):
+        """Test writing sample embeddings are saved and reloaded."""
+        profile.add_writing_sample("The dragon slept on its hoard of gold.")
+        profile.add_writing_sample("Rain fell over the quiet harbor town.")
+        
+        reloaded = VoiceProfile("test-profile", tmp_path)
+        assert reloaded.sample_embeddings.shape[0] == 2
+        assert reloaded.similar_samples("harbor rain", 1)[0]["text"].startswith("Rain")
+    
+    def test_batched_writes(self, tmp_path):
+        """Test that changes inside a with block are written once on exit."""
+        with VoiceProfile("test-profile", tmp_path) as profile:
+            profile.set_style_notes("Spare and lyrical")
+            profile.add_genre_preference("literary")
+            assert not profile.profile_file.exists()
+        
+        reloaded = VoiceProfile("test-profile", tmp_path)
+        assert reloaded.data["style_notes"] == "Spare and lyrical"
+        assert reloaded.data["genre_preferences"] == ["literary"]
+    
+    def test_unchanged_save_skipped(self, profile, tmp_path):
+        """Test that saving an unchanged profile doesn't rewrite it."""
+        profile.set_style_notes("Spare and lyrical")
+        updated_at = profile.data["updated_at"]
+        
+        profile.set_style_notes("Spare and lyrical")
+        profile.save()
+        VoiceProfile("test-profile", tmp_path).save()
+        
+        assert profile.data["updated_at"] == updated_at
+        assert json.loads(profile.profile_file.read_text())["updated_at"] == updated_at
+    
+    def test_reload_sees_external_changes(self, profile, tmp_path):
+        """Test that a profile file changed by another process is re-read."""
+        profile.set_style_notes("Spare and lyrical")
+        assert VoiceProfile("test-profile", tmp_path).data["style_notes"] == "Spare and lyrical"
+        
+        data = json.loads(profile.profile_file.read_text())
+        data["style_notes"] = "Ornate and baroque"
+        profile.profile_file.write_text(json.dumps(data))
+        assert VoiceProfile("test-profile", tmp_path).data["style_notes"] == "Ornate and baroque"
+    
+    def test_add_genre_preference(self, profile):
+        """Test adding genre preferences."""
+        profile.add_genre_preference("fantasy")
+        profile.add_genre_preference("sci-fi")
+        
+        assert "fantasy" in profile.data["genre_preferences"]
+        assert "sci-fi" in profile.data["genre_preferences"]
+        assert len(profile.data["genre_preferences"]) == 2
+        
+        # Direct edits to the list are picked up
+        profile.data["genre_preferences"] = ["noir", "western"]
+        profile.add_genre_preference("sci-fi")
+        assert profile.data["genre_preferences"] == ["noir", "western", "sci-fi"]
+    
+    def test_get_context_for_ai(self, profile):
+        """Test generating AI context."""
+        profile.set_style_notes("Literary fiction")
+        profile.add_genre_preference("mystery")
+        
+        context = profile.get_context_for_ai()
+        assert "Literary fiction" in context
+        assert "mystery" in context
+    
+    def test_list_profiles(self, tmp_path):
+        """Test listing profiles."""
+        # Create multiple profiles
+        VoiceProfile("profile1", tmp_path).save()
+        assert VoiceProfile.create_many(["profile1", "profile2", "profile3"], tmp_path) == ["profile2", "profile3"]
+        
+        profiles = VoiceProfile.list_profiles(tmp_path)
+        assert len(profiles) == 3
+        assert "profile1" in profiles
+        assert "profile2" in profiles
+        assert "profile3" in profiles
+    
+    def test_delete_profile(self, profile, tmp_path):
+        """Test deleting profiles."""
+        # Create and delete profile
+        profile.save()
+        
+        assert VoiceProfile.delete_profile("test-profile", tmp_path)
+        profiles = VoiceProfile.list_profiles(tmp_path)
+        assert "test-profile" not in profiles
+        
+        # Try deleting non-existent profile
+        assert not VoiceProfile.delete_profile("non-existent", tmp_path)
+
+
+class TestSemanticCache:
+    """Test semantic response cache."""
+    
+    def test_exact_and_similar_hits(self):
+        """Test hits for identical and near-identical requests."""
         with tempfile.TemporaryDirectory() as tmpdir:
-            # Create and save profile
-            profile1 = VoiceProfile("test-profile", Path(tmpdir))
-            profile1.set_style_notes("Test style notes")
-            profile1.save()
+            cache = SemanticCache(Path(tmpdir), embedding_model=None, semantic=True)
+            cache.put("describe", "prompt a", "A foggy harbor.", text="a foggy harbor at dawn")
             
-            # Load profile
-            profile2 = VoiceProfile("test-profile", Path(tmpdir))
-            assert profile2.data["style_notes"] == "Test style notes"
+            assert cache.get("describe", "prompt a") == "A foggy harbor."
+            assert cache.get("describe", "prompt b", text="A foggy harbor at dawn!") == "A foggy harbor."
+            assert cache.get("describe", "prompt c", text="a crowded train station") is None
+            assert cache.get("analyze", "prompt b", text="a foggy harbor at dawn") is None
     
-    def test_add_writing_sample(self):
-        """Test adding writing samples."""
+    def test_exact_only_matching(self):
+        """Test that reordered or extended text misses when only exact prompts may hit."""
         with tempfile.TemporaryDirectory() as tmpdir:
-            profile = VoiceProfile("test-profile", Path(tmpdir))
+            # Hash embeddings ignore word order, so they never match semantically
+            cache = SemanticCache(Path(tmpdir) / "hash", embedding_model=None)
+            cache.put("describe", "prompt a", "Man bites dog.", text="The dog bit the man")
+            assert cache.get("describe", "prompt b", text="The man bit the dog") is None
+            assert cache.get("describe", "prompt a") == "Man bites dog."
             
-            sample_text = "This is a test writing sample."
-            profile.add_writing_sample(sample_text, "Test sample")
+            cache = SemanticCache(Path(tmpdir) / "semantic", embedding_model=None, semantic=True)
+            cache.put("continue", "prompt a", "And then...", text="Chapter one.")
+            assert cache.get("continue", "prompt b", text="Chapter one. A new ending.", semantic=False) is None
+            assert cache.get("continue", "prompt a", semantic=False) == "And then..."
+    
+    def test_persistence_and_expiry(self):
+        """Test entries persist on disk and expire after the TTL."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            SemanticCache(Path(tmpdir), embedding_model=None).put("continue", "prompt", "Response")
             
-            assert len(profile.data["writing_samples"]) == 1
-            assert profile.data["writing_samples"][0]["text"] == sample_text
+            assert SemanticCache(Path(tmpdir), embedding_model=None).get("continue", "prompt") == "Response"
+            assert len(SemanticCache(Path(tmpdir), ttl=-1, embedding_model=None)) == 0
     
-    def test_add_genre_preference(self):
-        """Test adding genre preferences."""
+    def test_get_or_compute(self):
+        """Test computing only on a miss."""
         with tempfile.TemporaryDirectory() as tmpdir:
-            profile = VoiceProfile("test-profile", Path(tmpdir))
+            cache = SemanticCache(Path(tmpdir), embedding_model=None)
+            calls = []
             
-            profile.add_genre_preference("fantasy")
-            profile.add_genre_preference("sci-fi")
+            def compute():
+                calls.append(1)
+                return "Generated"
             
-            assert "fantasy" in profile.data["genre_preferences"]
-            assert "sci-fi" in profile.data["genre_preferences"]
-            assert len(profile.data["genre_preferences"]) == 2
+            assert cache.get_or_compute("brainstorm", "prompt", compute) == "Generated"
+            assert cache.get_or_compute("brainstorm", "prompt", compute) == "Generated"
+            assert len(calls) == 1
     
-    def test_get_context_for_ai(self):
-        """Test generating AI context."""
+    def test_quantized_embeddings(self):
+        """Test int8 embeddings still find near-identical requests after reloading."""
         with tempfile.TemporaryDirectory() as tmpdir:
-            profile = VoiceProfile("test-profile", Path(tmpdir))
+            SemanticCache(Path(tmpdir), embedding_model=None, quantize=True, semantic=True).put(
+                "describe", "prompt a", "A foggy harbor.", text="a foggy harbor at dawn"
+            )
             
-            profile.set_style_notes("Literary fiction")
-            profile.add_genre_preference("mystery")
+            cache = SemanticCache(Path(tmpdir), embedding_model=None, quantize=True, semantic=True)
+            assert cache.get("describe", "prompt b", text="A foggy harbor at dawn!") == "A foggy harbor."
+            assert cache.get("describe", "prompt c", text="a crowded train station") is None
+
+
+class TestMultiEngine:
+    """Test round-robin dispatch across engines."""
+    
+    def test_round_robin(self):
+        """Test requests alternate between child engines."""
+        class NamedEngine(AIEngine):
+            def __init__(self, name):
+                self.name = name
             
-            context = profile.get_context_for_ai()
-            assert "Literary fiction" in context
-            assert "mystery" in context
+            def generate(self, prompt, max_tokens=2000, temperature=0.8):
+                return self.name
+        
+        engine = MultiEngine([NamedEngine("a"), NamedEngine("b")])
+        assert [engine.generate("prompt") for _ in range(3)] == ["a", "b", "a"]
     
-    def test_list_profiles(self):
-        """Test listing profiles."""
+    def test_create_engine_with_key_list(self):
+        """Test a list of API keys creates one engine per key."""
+        engine = create_engine("openai", ["key-1", "key-2"], "gpt-4o")
+        assert isinstance(engine, MultiEngine)
+        assert [child.api_key for child in engine.engines] == ["key-1", "key-2"]
+        assert engine.model == "gpt-4o"
+
+
+class TestRateLimiter:
+    """Test adaptive rate limiting."""
+    
+    def test_bucket_waits_when_empty(self):
+        """Test requests beyond the per-minute limit are delayed."""
+        limiter = RateLimiter(requests_per_minute=60)
+        delays = [limiter.reserve() for _ in range(62)]
+        assert delays[59] == 0
+        assert delays[61] == pytest.approx(2.0, abs=0.1)
+    
+    def test_retry_after_rate_limit(self):
+        """Test a 429 lowers the limit and the request is retried."""
+        class RateLimitError(Exception):
+            status_code = 429
+            response = SimpleNamespace(status_code=429, headers={"retry-after": "0"})
+        
+        class FlakyEngine(AIEngine):
+            calls = 0
+            
+            def generate(self, prompt, max_tokens=2000, temperature=0.8):
+                self.calls += 1
+                if self.calls == 1:
+                    raise RateLimitError()
+                return "ok"
+        
+        limiter = RateLimiter(requests_per_minute=100)
+        engine = RateLimitedEngine(FlakyEngine(), limiter)
+        assert engine.generate("prompt") == "ok"
+        assert engine.engine.calls == 2
+        assert limiter.rates["requests_per_minute"] == pytest.approx(80)
+    
+    def test_learned_rates_saved_per_key(self):
+        """Test each API key's adapted limits are saved separately, without the key."""
         with tempfile.TemporaryDirectory() as tmpdir:
-            # Create multiple profiles
-            VoiceProfile("profile1", Path(tmpdir)).save()
-            VoiceProfile("profile2", Path(tmpdir)).save()
-            VoiceProfile("profile3", Path(tmpdir)).save()
-            
-            profiles = VoiceProfile.list_profiles(Path(tmpdir))
-            assert len(profiles) == 3
-            assert "profile1" in profiles
-            assert "profile2" in profiles
-            assert "profile3" in profiles
-    
-    def test_delete_profile(self):
-        """Test deleting profiles."""
+            assistant = WritingAssistant(Path(tmpdir))
+            assistant.config.set("rate_limits", {"openai": {"requests_per_minute": 100}})
+            first = assistant._rate_limited(SimpleNamespace(provider="openai", api_key="sk-learned-a", model="gpt-4"))
+            second = assistant._rate_limited(SimpleNamespace(provider="openai", api_key="sk-learned-b", model="gpt-4"))
+            
+            first.limiter.on_rate_limited(0)
+            second.limiter.on_rate_limited(0)
+            second.limiter.on_rate_limited(0)
+            
+            learned = assistant.config.get("rate_limits_learned")["openai"]
+            assert learned[key_fingerprint("sk-learned-a")]["requests_per_minute"] == pytest.approx(80)
+            assert learned[key_fingerprint("sk-learned-b")]["requests_per_minute"] == pytest.approx(64)
+            assert "sk-learned" not in json.dumps(learned)
+
+
+class TestTokens:
+    """Test token budgeting."""
+    
+    def test_truncate(self):
+        """Test keeping the head, tail, or both ends of long text."""
+        text = "Opening line. " + "middle " * 5000 + "Final line."
+        
+        assert tokens.truncate("gpt-4", "Short text.", 100) == "Short text."
+        assert tokens.truncate("gpt-4", text, 100, keep="head").startswith("Opening line.")
+        assert tokens.truncate("gpt-4", text, 100, keep="tail").endswith("Final line.")
+        
+        both = tokens.truncate("gpt-4", text, 100, keep="head_tail")
+        assert both.startswith("Opening line.") and both.endswith("Final line.")
+        assert tokens.count("gpt-4", both) <= 100
+        
+        for keep in ("head", "tail"):
+            assert tokens.count("gpt-4", tokens.truncate("gpt-4", text, 100, keep=keep)) <= 100
+    
+    def test_context_limit(self):
+        """Test model context window lookup."""
+        assert tokens.context_limit("gpt-4") == 8192
+        assert tokens.context_limit("gpt-4o-mini") == 128000
+        assert tokens.context_limit("claude-3-5-sonnet-20241022") == 200000
+        assert tokens.context_limit(None) == tokens.DEFAULT_CONTEXT_LIMIT
+
+
+class TestWritingAssistant:
+    """Test writing assistant generation paths."""
+    
+    def test_run_batch(self):
+        """Test running tasks concurrently in request order."""
         with tempfile.TemporaryDirectory() as tmpdir:
-            # Create and delete profile
-            VoiceProfile("test-profile", Path(tmpdir)).save()
+            assistant = WritingAssistant(Path(tmpdir))
+            assistant.engine = EchoEngine()
             
-            assert VoiceProfile.delete_profile("test-profile", Path(tmpdir))
-            profiles = VoiceProfile.list_profiles(Path(tmpdir))
-            assert "test-profile" not in profiles
+            results = assistant.run_batch([
+                ("analyze", {"text": "First text"}),
+                ("rewrite", {"text": "Second text", "instruction": "darker"}),
+            ])
+            assert results == ["First text", "Second text"]
+            
+            with pytest.raises(ValueError):
+                assistant.run_batch([("unknown", {})])
+    
+    def test_stream(self):
+        """Test streaming a task and reusing the cached result."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            assistant = WritingAssistant(Path(tmpdir))
+            assistant.engine = EchoEngine()
+            
+            assert "".join(assistant.stream("analyze", text="Some text")) == "Some text"
+            
+            # A second request is served from the cache without the engine
+            assistant.engine.generate = None
+            assert "".join(assistant.stream("analyze", text="Some text")) == "Some text"
+    
+    def test_cache_keyed_by_model(self):
+        """Test that a cached response isn't reused after switching models."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            assistant = WritingAssistant(Path(tmpdir))
+            assistant.engine = EchoEngine()
+            first = assistant.describe("a harbor")
+            assert assistant.describe("a harbor") == first
             
-            # Try deleting non-existent profile
-            assert not VoiceProfile.delete_profile("non-existent", Path(tmpdir))
+            assistant.config.set("model", "gpt-4o")
+            assistant.engine.generate = lambda *args: "From gpt-4o"
+            assert assistant.describe("a harbor") == "From gpt-4o"
 
 
 if __name__ == "__main__":